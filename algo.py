@@ -1,9 +1,18 @@
 import os
 import sys
-import random
+import time
+import atexit
+import hashlib
+import contextlib
+import multiprocessing
 import provider
+import metrics
 import pickle
-from threading import Thread
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
 
 
 ENABLER = 1
@@ -13,132 +22,434 @@ SEPARATOR = 1
 OPERATOR_MAP = ('==', '!=', '>', '<')
 SEPARATOR_MAP = ('|', '&')
 STOPLOSS = 4
+OPERATOR_FUNCTIONS = {'==': np.equal, '!=': np.not_equal, '>': np.greater, '<': np.less}
+COMPILE_CACHE = 4096
+FITNESS_CACHE = 65536
 
 GENE = ENABLER + NUMBER + NUMBER + OPERATOR + NUMBER + NUMBER + SEPARATOR + STOPLOSS
 
 
-def to_function(gene: str, template: str = '__number__'):
+rng = np.random.default_rng()
+
+
+# genes are packed uint8 arrays of GENE bits per block, string genes convert losslessly
+def to_bits(gene: str):
+    return np.packbits(np.frombuffer(gene.encode('ascii'), dtype=np.uint8) - ord('0'))
+
+
+def to_string(gene):
+    return (unpack(gene) + ord('0')).tobytes().decode('ascii')
+
+
+def bit_count(gene):
+    # padding bits are dropped, a gene is always a whole number of blocks
+    return (gene.shape[-1] * 8 // GENE) * GENE
+
+
+def unpack(gene):
+    return np.unpackbits(gene, count=bit_count(gene))
+
+
+def to_key(gene):
+    # hashable form for the caches
+    if isinstance(gene, str): gene = to_bits(gene)
+    return gene.tobytes()
+
+
+def field(blocks, start, width):
+    return blocks[:, start:start + width] @ (1 << np.arange(width - 1, -1, -1))
+
+
+def decode(gene):
+    return decode_key(to_key(gene))
+
+
+@lru_cache(maxsize=COMPILE_CACHE)
+def decode_key(key: bytes):
+    # clauses as ((ref, number, factor), operator, (ref, number, factor), separator), factor is None when disabled
     f = 0.015748031496062992
+    blocks = unpack(np.frombuffer(key, dtype=np.uint8)).reshape(-1, GENE).astype(np.int64)
+    blocks = blocks[blocks[:, 0] == 1]
+    if not len(blocks): return (), 1.0
+
+    n = ENABLER
+    left_ref, left = field(blocks, n, 1), field(blocks, n + 1, NUMBER - 1)
+    n += NUMBER
+    left_enabled, left_factor = field(blocks, n, 1), field(blocks, n + 1, NUMBER - 1)
+    n += NUMBER
+    operator = field(blocks, n, OPERATOR)
+    n += OPERATOR
+    right_ref, right = field(blocks, n, 1), field(blocks, n + 1, NUMBER - 1)
+    n += NUMBER
+    right_enabled, right_factor = field(blocks, n, 1), field(blocks, n + 1, NUMBER - 1)
+    n += NUMBER
+    separator = field(blocks, n, SEPARATOR)
+    n += SEPARATOR
+    stoploss = field(blocks, n, STOPLOSS)
+
+    clauses = tuple(
+        (
+            (bool(left_ref[i]), int(left[i]), (int(left_factor[i]) - 63.5) * f if left_enabled[i] else None),
+            OPERATOR_MAP[operator[i]],
+            (bool(right_ref[i]), int(right[i]), (int(right_factor[i]) - 63.5) * f if right_enabled[i] else None),
+            SEPARATOR_MAP[separator[i]],
+        )
+        for i in range(len(blocks))
+    )
+    return clauses, 1.0 - ( int(stoploss[-1]) / 100 )
+
+
+def canonical(gene):
+    # the expression a gene evaluates to: enabled blocks only, disabled factors dropped
+    # and no separator after the last clause, genes that only differ elsewhere behave the same
+    clauses, stoploss = decode(gene)
+    if clauses: clauses = clauses[:-1] + (clauses[-1][:3] + (None,),)
+    return clauses, stoploss
+
+
+def window_key(data):
+    # digest of a data window, for the fitness cache
+    data = np.ascontiguousarray(data)
+    return data.shape, hashlib.blake2b(data.tobytes(), digest_size=16).digest()
+
+
+def to_operand(operand, template: str = '__number__'):
+    ref, number, factor = operand
+    result = template.replace('__number__', str(number)) if ref else str(number)
+    if factor is not None: result += f'*{factor}'
+    return result
+
+
+def to_function(gene, template: str = '__number__'):
+    clauses, stoploss = decode(gene)
     function = ''
-    stoploss = 1.0
-    n = 0
-    while True:
-        if n >= len(gene) - 1: break
-
-        enabled = bool(int(gene[n:n + ENABLER], 2))
-        n += ENABLER
-
-        if not enabled:
-            n += (GENE - ENABLER)
-            continue
-
-        value_or_ref = bool(int(gene[n], 2))
-        left = str(int(gene[n + 1:n + NUMBER], 2))
-        if value_or_ref: left = template.replace('__number__', left)
-        n += NUMBER
-
-        enabled = bool(int(gene[n], 2))
-        left_factor = str((int(gene[n + 1:n + NUMBER], 2) - 63.5) * f)
-        if enabled: left += f'*{left_factor}'
-        n += NUMBER
-
-        operator = OPERATOR_MAP[int(gene[n:n + OPERATOR], 2)]
-        n += OPERATOR
-
-        value_or_ref = bool(int(gene[n], 2))
-        right = str(int(gene[n + 1:n + NUMBER], 2))
-        if value_or_ref: right = template.replace('__number__', right)
-        n += NUMBER
-
-        enabled = bool(int(gene[n], 2))
-        right_factor = str((int(gene[n + 1:n + NUMBER], 2) - 63.5) * f)
-        if enabled: right += f'*{right_factor}'
-        n += NUMBER
-
-        function += f'(({left}){operator}({right})){SEPARATOR_MAP[int(gene[n:n + SEPARATOR], 2)]}'
-        n += SEPARATOR
-
-        stoploss = 1.0 - ( int(gene[n:n + STOPLOSS], 2) / 100 )
-        n += STOPLOSS
-        
+    for left, operator, right, separator in clauses:
+        function += f'(({to_operand(left, template)}){operator}({to_operand(right, template)})){separator}'
     
     function = function[:-1]
     if not function: function = 'False'
     return function, stoploss
 
 
-def new_gene(gene_size):
-    return ''.join([str(random.randint(0,1)) for _ in range(GENE) for _ in range(gene_size)])
+def compile_gene(gene, template: str = '__number__'):
+    # parse once, survivors and clones reuse the compiled callable
+    return compile_key(to_key(gene), template)
+
+
+@lru_cache(maxsize=COMPILE_CACHE)
+def compile_key(key: bytes, template: str):
+    function, stoploss = to_function(gene=np.frombuffer(key, dtype=np.uint8), template=template)
+    return eval(f'lambda data: {function}'), stoploss
+
+
+def signals(genes, data, template):
+    # (genes x time) matrix of what the compiled genes return for every row of data
+    # identical operands and comparisons are only evaluated once for all genes
+    rows = template.replace('data[-1,', 'data[:,')
+    operands = {}
+    atoms = {}
+
+    def operand(key):
+        if key not in operands:
+            ref, number, factor = key
+            value = eval(rows.replace('__number__', str(number)), {'data': data}) if ref else number
+            if factor is not None: value = value * factor
+            operands[key] = value
+        return operands[key]
+
+    def atom(clause):
+        left, operator, right, _ = clause
+        key = (left, operator, right)
+        if key not in atoms:
+            atoms[key] = np.broadcast_to(OPERATOR_FUNCTIONS[operator](operand(left), operand(right)), len(data))
+        return atoms[key]
+
+    result = np.zeros((len(genes), len(data)), dtype=bool)
+    for i, gene in enumerate(genes):
+        clauses, _ = decode(gene)
+        if not clauses: continue
+
+        # & binds stronger than |, so the expression is an or of and-groups
+        group = atom(clauses[0])
+        for previous, clause in zip(clauses, clauses[1:]):
+            if previous[3] == '&':
+                group = group & atom(clause)
+            else:
+                result[i] |= group
+                group = atom(clause)
+        result[i] |= group
+
+    return result
+
+
+def simulate(buy, sell, stoploss, close, wallet_start):
+    # run_node's position and stop-loss state machine for all nodes at once, returns their score
+    # like run_node, the last candle is acted on twice
+    quo = np.full(len(buy), float(wallet_start))
+    sym = np.zeros(len(buy))
+    history = np.zeros(len(buy))
+
+    for t in [*range(len(close)), len(close) - 1]:
+        price = close[t]
+        buy_signal = buy[:, t] & (sym == 0) & (quo > 10)
+        sell_signal = ((sym != 0) & (history * stoploss > price)) | sell[:, t]
+        sell_signal &= ~buy_signal
+
+        if buy_signal.any():
+            amount = (quo - (quo * 0.0025)) / price
+            sym = np.where(buy_signal, sym + amount, sym)
+            quo = np.where(buy_signal, quo - quo, quo)
+            history = np.where(buy_signal, price, history)
+
+        if sell_signal.any():
+            amount_quote = sym * price
+            amount_quote -= amount_quote * 0.0025
+            quo = np.where(sell_signal, quo + amount_quote, quo)
+            sym = np.where(sell_signal, sym - sym, sym)
+
+    return (close[-1] * 0.25 * sym) + (quo * 0.75)
+
+
+def evaluate(buy_genes, sell_genes, data, template, wallet_start):
+    buy = signals(buy_genes, data, template)
+    sell = signals(sell_genes, data, template)
+    stoploss = np.array([decode(gene)[1] for gene in sell_genes])
+    return simulate(buy, sell, stoploss, data[:, 4], wallet_start)
+
+
+class SharedWindow:
+    # data window copied into shared memory once, workers map it instead of receiving a pickled copy
+    # the owner replaces it when the window changes and unlinks it
+    def __init__(self):
+        self.shm = None
+        self.source = None
+
+    def publish(self, data):
+        if data is self.source: return
+        self.close()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        np.ndarray(data.shape, dtype=float, buffer=self.shm.buf)[:] = data
+        self.source = data
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+        self.shm = None
+        self.source = None
+
+
+# worker side of the process pool, the published window stays attached between generations
+attached = {}
+
+
+def evaluate_shared(name, shape, buy_genes, sell_genes, template, wallet_start):
+    if name not in attached:
+        for shm, _ in attached.values(): shm.close()
+        attached.clear()
+        shm = shared_memory.SharedMemory(name=name)
+        attached[name] = (shm, np.ndarray(shape, dtype=float, buffer=shm.buf))
+    _, data = attached[name]
+    return evaluate(buy_genes, sell_genes, data, template, wallet_start)
+
+
+def read_shared(name, shape):
+    # private copy of a published window
+    shm = shared_memory.SharedMemory(name=name)
+    data = np.ndarray(shape, dtype=float, buffer=shm.buf).copy()
+    shm.close()
+    return data
 
 
-def mutate(gene, rate):
-    subject = list(gene)
-    for n in range(len(subject)):
-        if random.random() < rate:
-            subject[n] = {'0':'1', '1':'0'}[subject[n]]
-    return ''.join(subject)
+def reseed(seed: np.random.SeedSequence):
+    # forked processes start with a copy of the parent's generator, give this one its own
+    global rng
+    rng = np.random.default_rng(seed)
 
 
-def dbz(left, right):
-    try:
-        return left / right
-    except ZeroDivisionError:
-        return 0
+def island(connection, settings, number, metrics_path=None, seed=None):
+    # one Incubator per process, driven by Archipelago over a pipe
+    # seeded before the Incubator spawns its population, so every island evolves on its own
+    reseed(seed if seed is not None else np.random.SeedSequence())
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        recorder = metrics.Metrics(metrics_path) if metrics_path else metrics.disabled
+        incubator = Incubator(**settings, island=number, metrics=recorder)
+        name, data = None, None
+        while True:
+            command, *args = connection.recv()
+            if command == 'close': break
 
+            window, shape, template, immigrants, emigrants = args
+            if window != name: name, data = window, read_shared(window, shape)
+            incubator.immigrate(immigrants)
+            incubator.run(data, template)
+            connection.send((incubator.select_best(), incubator.migrants(emigrants)))
+    recorder.close()
+    connection.close()
 
-def select_simple(population, number, mode):
-    if mode == 'best':
-        return sorted(population, key=lambda n: n['perf'])[0-number:]
 
-    if mode == 'worst':
-        return sorted(population, key=lambda n: n['perf'])[0:number]
+def new_genes(number, gene_size):
+    # random bytes, with the padding bits of the last byte cleared like packbits leaves them
+    width = -(-GENE * gene_size // 8)
+    genes = rng.integers(0, 256, size=(number, width), dtype=np.uint8)
+    padding = width * 8 - GENE * gene_size
+    if padding: genes[:, -1] &= (0xFF << padding) & 0xFF
+    return genes
 
 
-def select(population, number, mode):
-    if mode == 'best':
-        probabilities = [p['perf'] / len(population) for p in population]
-    if mode == 'worst':
-        probabilities = [dbz(len(population), p['perf']) for p in population]
-    candidates = [random.choices(population, probabilities)[0] for _ in range(number)]
+def new_gene(gene_size):
+    return new_genes(1, gene_size)[0]
 
-    return candidates
+
+def mutate(gene, rate):
+    # every bit flips with probability `rate`, works on a single gene or a (genes x bytes) array
+    # the flips are drawn as geometric gaps between them, so the cost follows the number of flips
+    if rate <= 0: return gene.copy()
+    width, bits = gene.shape[-1], bit_count(gene)
+    total = (gene.size // width) * bits
+    scale = np.log1p(-rate) if rate < 1 else -np.inf
+
+    chunks, position = [], -1
+    while position < total:
+        gaps = np.floor(np.log(1.0 - rng.random(int(total * rate * 1.05) + 64)) / scale) + 1
+        positions = position + np.cumsum(gaps.astype(np.int64))
+        chunks.append(positions[positions < total])
+        position = positions[-1]
+
+    row, bit = np.divmod(np.concatenate(chunks), bits)
+    mask = np.zeros(gene.size, dtype=np.uint8)
+    np.bitwise_or.at(mask, row * width + (bit >> 3), (128 >> (bit & 7)).astype(np.uint8))
+    return gene ^ mask.reshape(gene.shape)
+
+
+class Population:
+    # genes and fitness of every node in arrays, one row per node, selection works on row indices
+    def __init__(self, buy, sell, perf=None):
+        self.buy = np.asarray(buy, dtype=np.uint8)
+        self.sell = np.asarray(sell, dtype=np.uint8)
+        self.perf = np.zeros(len(self.buy)) if perf is None else np.asarray(perf, dtype=float)
+
+    @classmethod
+    def spawn(cls, number, gene_size):
+        return cls(new_genes(number, gene_size), new_genes(number, gene_size))
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        if isinstance(nodes, cls): return nodes
+        nodes = list(nodes)
+        if not nodes: return cls(np.empty((0, 0)), np.empty((0, 0)))
+        return cls(
+            np.stack([node['buy'] for node in nodes]),
+            np.stack([node['sell'] for node in nodes]),
+            [node['perf'] for node in nodes],
+        )
+
+    def __len__(self):
+        return len(self.perf)
+
+    def __getitem__(self, index):
+        # a row is a node dict on views of the arrays, anything else a smaller population
+        if isinstance(index, (int, np.integer)):
+            return {'buy': self.buy[index], 'sell': self.sell[index], 'perf': float(self.perf[index])}
+        return Population(self.buy[index], self.sell[index], self.perf[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __add__(self, other):
+        if not len(self): return other
+        if not len(other): return self
+        return Population(
+            np.concatenate([self.buy, other.buy]),
+            np.concatenate([self.sell, other.sell]),
+            np.concatenate([self.perf, other.perf]),
+        )
+
+    def best(self, number):
+        # rows of the `number` best, best last
+        number = min(number, len(self))
+        if not number: return np.empty(0, dtype=np.int64)
+        rows = np.argpartition(self.perf, len(self) - number)[len(self) - number:]
+        return rows[np.argsort(self.perf[rows], kind='stable')]
+
+    def worst(self, number):
+        # rows of the `number` worst, in no particular order
+        number = min(number, len(self))
+        if not number: return np.empty(0, dtype=np.int64)
+        return np.argpartition(self.perf, number - 1)[:number]
+
+    def select(self, number, mode, replace=True):
+        # fitness proportionate rows, 'worst' weighs by the inverse fitness
+        if mode == 'best':
+            weights = self.perf.clip(0)
+        if mode == 'worst':
+            weights = np.divide(1.0, self.perf, out=np.zeros(len(self)), where=self.perf != 0).clip(0)
+        total = weights.sum()
+        p = weights / total if total > 0 else None
+        return rng.choice(len(self), number, replace=replace, p=p)
+
+    def replace(self, rows, other):
+        # in place, `other` takes over the given rows
+        self.buy[rows] = other.buy
+        self.sell[rows] = other.sell
+        self.perf[rows] = other.perf
+
+    def without(self, rows):
+        keep = np.ones(len(self), dtype=bool)
+        keep[rows] = False
+        return self[keep]
+
+
+def breed(population, candidates, number, gene_size, rate):
+    # children in rounds of five per pair of different candidates, like the loop it replaces:
+    # four mutated buy/sell swaps of mother and father, then a random node
+    rounds = -(-number // 5)
+    first = rng.integers(0, len(candidates), rounds)
+    second = (first + rng.integers(1, max(len(candidates), 2), rounds)) % len(candidates)
+    mother, father = candidates[first], candidates[second]
+
+    buy, sell = population.buy, population.sell
+    children_buy = mutate(np.stack([buy[father], buy[mother], sell[father], sell[mother]], axis=1), rate)
+    children_sell = mutate(np.stack([sell[mother], sell[father], buy[mother], buy[father]], axis=1), rate)
+    children_buy = np.concatenate([children_buy, new_genes(rounds, gene_size)[:, None]], axis=1)
+    children_sell = np.concatenate([children_sell, new_genes(rounds, gene_size)[:, None]], axis=1)
+
+    width = buy.shape[-1]
+    return Population(children_buy.reshape(-1, width)[:number], children_sell.reshape(-1, width)[:number])
 
 
 def score(node, symbol, quote):
     api = node['api']
     return \
-        ( float(api.current[-1, 4] * 0.25 * float(api.get_balance(symbol=symbol)[0]['available'])) ) \
+        ( float(api.current[-1, 4] * 0.25 * float(api.available(symbol))) ) \
         + \
-        ( float(api.get_balance(symbol=quote)[0]['available']) * 0.75 )
+        ( float(api.available(quote)) * 0.75 )
 
 
 def run_node(node, market, template):
+    # per-candle reference of simulate(), node['api'] is a TestClient holding the data
+    buy, _ = compile_gene(node['buy'], template)
+    sell, stoploss = compile_gene(node['sell'], template)
+
     step_counter, step = -1, True
     while step:
         step_counter, step = node['api'].step(step_counter, 1)
         symbol, quote = market.split('-')
         data = node['api'].get_data()
 
-        for trade in node['api'].get_trades(market):
-            if trade.get('side', '') != 'buy': continue
-            history = trade.get('price', 0.0)
-            break
-        else:
-            history = 0.0
+        history = node['api'].last_buy_price(market)
         
-        quo = node['api'].get_balance(quote)[0]['available']
-        sym = node['api'].get_balance(symbol)[0]['available']
+        quo = node['api'].available(quote)
+        sym = node['api'].available(symbol)
 
-        buy, _ = to_function(gene=node['buy'], template=template)
-        sell, stoploss = to_function(gene=node['sell'], template=template)
-        
-        buy_signal = eval(buy) & (sym == 0) & (quo > 10)
-        sell_signal = (sym != 0) & (history * stoploss > data[-1, 4]) | eval(sell)
+        buy_signal = buy(data) & (sym == 0) & (quo > 10)
+        sell_signal = (sym != 0) & (history * stoploss > data[-1, 4]) | sell(data)
         
         if buy_signal and sell_signal: sell_signal = False
 
-        quo = float(node['api'].get_balance(symbol=quote)[0]['available'])
-        sym = float(node['api'].get_balance(symbol=symbol)[0]['available'])
+        quo = float(node['api'].available(quote))
+        sym = float(node['api'].available(symbol))
 
         if buy_signal:
             result = node['api'].place_order(market=market, side='buy', order_type='market', amountQuote=quo)
@@ -156,16 +467,41 @@ def load(path):
     if os.path.exists(path):
         with open(path, 'rb') as fh:
             data = pickle.load(fh)
+    for node in data:
+        if isinstance(node['buy'], str): node['buy'] = to_bits(node['buy'])
+        if isinstance(node['sell'], str): node['sell'] = to_bits(node['sell'])
     return data
 
 
-def save(path, data):
-    with open(path, 'wb') as fh:
-        pickle.dump(data, fh)
+def save_checkpoint(path, population, **meta):
+    # genes, fitness and metadata only, written next to the checkpoint and renamed over it
+    population = Population.from_nodes(population)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as fh:
+        np.savez(
+            fh,
+            buy=population.buy,
+            sell=population.sell,
+            perf=population.perf,
+            **{key: np.asarray(value) for key, value in meta.items()},
+        )
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def load_checkpoint(path):
+    population, meta = Population.from_nodes([]), {}
+    if os.path.exists(path):
+        with np.load(path) as fh:
+            population = Population(fh['buy'], fh['sell'], fh['perf'])
+            meta = {key: fh[key].item() for key in fh.files if key not in ('buy', 'sell', 'perf')}
+    return population, meta
 
 
 class Incubator():
-    def __init__(self, api_class, markets: str, interval: str, window_size: int, population_size: int, gene_size: int, mutation_rate: int):
+    def __init__(self, api_class, markets: str, interval: str, window_size: int, population_size: int, gene_size: int, mutation_rate: int, workers: int = 0, island: int | None = None, metrics: metrics.Metrics = metrics.disabled):
         self.api_class = api_class
         self.markets = markets
         self.market = markets[0]
@@ -175,22 +511,43 @@ class Incubator():
         self.gene_size = gene_size
         self.mutation_rate = mutation_rate
         self.wallet_start = 1000.0
-
-        self.path = f'data/gene-{self.market}_{interval}_w{window_size}_p{population_size}_g{gene_size}.dat'
-        self.population = load(self.path)
-        if self.population == []:
+        self.metrics = metrics
+
+        # process pool, 0 evaluates in this process
+        self.workers = workers
+        self.pool = None
+        self.shared = SharedWindow()
+
+        # fitness per (buy expression, sell expression and stoploss, template, window), least recently used go first
+        self.fitness = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.window = None
+        self.window_source = None
+
+        # islands of an Archipelago keep a checkpoint each
+        self.island = island
+        suffix = '' if island is None else f'_i{island}'
+        self.path = f'data/gene-{self.market}_{interval}_w{window_size}_p{population_size}_g{gene_size}{suffix}.npz'
+        self.population, meta = load_checkpoint(self.path)
+        self.generation = meta.get('generation', 0)
+        if not len(self.population):
+            # pickled populations from before the checkpoint format
+            self.population = Population.from_nodes(load(self.path[:-len('.npz')] + '.dat'))
+        if not len(self.population):
             print(f'Spawning new population: {self.market=}, {interval=}, {window_size=}, {population_size=}, {gene_size=}')
-            for _ in range(self.population_size):
-                self.population.append({
-                    'api': self.api_class(balance={'EUR': 1000.0}),
-                    'buy': new_gene(self.gene_size),
-                    'sell': new_gene(self.gene_size),
-                    'perf': 0.0,
-                })
-            save(self.path, self.population)
+            self.population = Population.spawn(self.population_size, self.gene_size)
+        if not os.path.exists(self.path): self.save()
+
+    def save(self):
+        return save_checkpoint(
+            self.path, self.population,
+            generation=self.generation, market=self.market, interval=self.interval,
+            window_size=self.window_size, gene_size=self.gene_size,
+        )
 
     def select_best(self):
-        return select_simple(self.population, 1, 'best')[0]
+        return self.population[self.population.best(1)[0]]
     
     def function_best(self, template):
         best = self.select_best()
@@ -198,92 +555,213 @@ class Incubator():
         sell, stoploss = to_function(gene=best['sell'], template=template)
         return buy, sell, stoploss
     
+    def immigrate(self, nodes):
+        # nodes from another island take the place of the worst ones
+        if not len(nodes): return
+        self.population = self.population.without(self.population.worst(len(nodes))) + Population.from_nodes(nodes)
+
+    def migrants(self, number):
+        return self.population[self.population.best(number)]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.shared.close()
+
+    def evaluate(self, data, template):
+        # survivors and equivalent genes come from the cache, every other expression is simulated once
+        if data is not self.window_source:
+            self.window = window_key(data)
+            self.window_source = data
+
+        population = self.population
+        with self.metrics.stage('canonical'):
+            keys = [(canonical(buy)[0], canonical(sell), template, self.window) for buy, sell in zip(population.buy, population.sell)]
+        missing = {}
+        for row, key in enumerate(keys):
+            if key in self.fitness:
+                self.fitness.move_to_end(key)
+                self.hits += 1
+            elif key not in missing:
+                missing[key] = row
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if missing:
+            rows = np.fromiter(missing.values(), dtype=np.int64, count=len(missing))
+            with self.metrics.stage('simulate'):
+                perf = self.simulate(population.buy[rows], population.sell[rows], data, template)
+            for key, p in zip(missing, perf): self.fitness[key] = float(p)
+            while len(self.fitness) > FITNESS_CACHE: self.fitness.popitem(last=False)
+
+        return np.array([self.fitness[key] for key in keys])
+
+    def simulate(self, buy_genes, sell_genes, data, template):
+        if not self.workers:
+            return evaluate(buy_genes, sell_genes, data, template, self.wallet_start)
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            atexit.register(self.close)
+        self.shared.publish(data)
+
+        futures = []
+        for chunk in np.array_split(np.arange(len(buy_genes)), self.workers):
+            if not len(chunk): continue
+            futures.append(self.pool.submit(
+                evaluate_shared, self.shared.shm.name, data.shape,
+                buy_genes[chunk], sell_genes[chunk],
+                template, self.wallet_start,
+            ))
+        return np.concatenate([future.result() for future in futures])
+
     def run(self, data, template):
-        # reset
-        for node in self.population:
-            node['api'].set_data(data=data)
-            node['api'].set_balance({'EUR': self.wallet_start})
-        
         print(f'{provider.to_date(data[0, 0])} --> {provider.to_date(data[-1, 0])}')
+        start = time.perf_counter()
         
         # exit
-        with open('lock', 'r') as lock:
-            if lock.read(): sys.exit()
+        with self.metrics.stage('lock'):
+            with open('lock', 'r') as lock:
+                if lock.read(): sys.exit()
 
-        # threads
+        # evaluate
         print(f'[{' ' * len(self.population)}]\r[', end='')
-        threads = []
-        for node in self.population:
-            thread = Thread(target=run_node, args=(node, self.market, template,))
-            threads.append(thread)
-            thread.start()
-        for thread in threads: thread.join()
-        print()
+        hits, misses = self.hits, self.misses
+        with self.metrics.stage('evaluate'):
+            self.population.perf = self.evaluate(data, template)
+        print('-' * len(self.population))
+        print(f'fitness cache: {self.hits - hits} hits, {self.misses - misses} simulated, {len(self.fitness)} stored')
+        self.metrics.count('nodes', len(self.population))
+        self.metrics.count('simulated', self.misses - misses)
+        self.metrics.count('cache_hits', self.hits - hits)
+        self.metrics.count('candles', (self.misses - misses) * len(data))
 
         # exit
-        with open('lock', 'r') as lock:
-            if lock.read(): sys.exit()
-
-        # penalize passives
-        for node in self.population:
-            if node['perf'] == self.wallet_start: node['perf'] = self.wallet_start / 2
-
-        # select best and worst
-        candidates = select(self.population, int(self.population_size / 4) or 2, 'best')
-        for n in select_simple(self.population,  int(self.population_size / 4) or 1, 'worst'):
-            self.population.remove(n)
-
-        while self.population_size > len(self.population):
-            mother, father = random.sample(candidates, 2)
-            
-            self.population.append({ # Mutated Node
-                'api': self.api_class(balance={'EUR': self.wallet_start}),
-                'buy': mutate(father['buy'], self.mutation_rate),
-                'sell': mutate(mother['sell'], self.mutation_rate),
-                'perf': 0.0,
-            })
-            if len(self.population) == self.population_size: continue
-
-            self.population.append({ # Mutated Node
-                'api': self.api_class(balance={'EUR': self.wallet_start}),
-                'buy': mutate(mother['buy'], self.mutation_rate),
-                'sell': mutate(father['sell'], self.mutation_rate),
-                'perf': 0.0,
-            })
-            if len(self.population) == self.population_size: continue
-
-            self.population.append({ # Mutated Node
-                'api': self.api_class(balance={'EUR': self.wallet_start}),
-                'buy': mutate(father['sell'], self.mutation_rate),
-                'sell': mutate(mother['buy'], self.mutation_rate),
-                'perf': 0.0,
-            })
-            if len(self.population) == self.population_size: continue
-
-            self.population.append({ # Mutated Node
-                'api': self.api_class(balance={'EUR': self.wallet_start}),
-                'buy': mutate(mother['sell'], self.mutation_rate),
-                'sell': mutate(father['buy'], self.mutation_rate),
-                'perf': 0.0,
-            })
-            if len(self.population) == self.population_size: continue
-
-            self.population.append({ # Random Node
-                'api': self.api_class(balance={'EUR': self.wallet_start}),
-                'buy': new_gene(self.gene_size),
-                'sell': new_gene(self.gene_size),
-                'perf': 0.0,
-            })
-            if len(self.population) == self.population_size: continue
-
-        # remove overpopulation
-        while len(self.population) > self.population_size:
-            print('WARNING: OVERPOPULATION')
-            self.population.remove(select(self.population, 1, 'worst')[0])
+        with self.metrics.stage('lock'):
+            with open('lock', 'r') as lock:
+                if lock.read(): sys.exit()
+
+        with self.metrics.stage('select'):
+            # penalize passives
+            population = self.population
+            population.perf[population.perf == self.wallet_start] = self.wallet_start / 2
+
+            # select best and worst, cull the worst and refill with children of the best
+            candidates = population.select(int(self.population_size / 4) or 2, 'best')
+            worst = population.worst(int(self.population_size / 4) or 1)
+            children = breed(population, candidates, self.population_size - len(population) + len(worst), self.gene_size, self.mutation_rate)
+            if len(children) == len(worst):
+                population.replace(worst, children)
+            else:
+                population = population.without(worst) + children
+
+            # remove overpopulation
+            if len(population) > self.population_size:
+                print('WARNING: OVERPOPULATION')
+                population = population.without(population.select(len(population) - self.population_size, 'worst', replace=False))
+            self.population = population
         
-        save(self.path, self.population)
+        self.generation += 1
+        with self.metrics.stage('checkpoint'):
+            self.metrics.count('checkpoint_bytes', self.save())
         
         best = self.select_best()
         print(f'{best["perf"]=}')
+        self.emit_generation(start, best['perf'])
+
+        return self.function_best(template)
+
+    def emit_generation(self, start, best):
+        if not self.metrics.enabled: return
+        simulate = self.metrics.stages.get('simulate', 0.0)
+        candles = self.metrics.counters.get('candles', 0)
+        self.metrics.emit(
+            'generation', generation=self.generation, island=self.island, best=float(best),
+            seconds=time.perf_counter() - start, candles_per_second=candles / simulate if simulate else None,
+        )
+
+
+class Archipelago():
+    # island model: independent Incubators in their own processes, each with its own checkpoint
+    # every `migration_interval` generations the best `migrants` of each island replace the worst of the next one
+    def __init__(self, api_class, markets: str, interval: str, window_size: int, population_size: int, gene_size: int, mutation_rate: int, islands: int = 4, migration_interval: int = 5, migrants: int = 2, metrics: metrics.Metrics = metrics.disabled):
+        self.islands = islands
+        self.metrics = metrics
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.generation = 0
+        self.best = None
+        self.incoming = [[] for _ in range(islands)]
+        self.shared = SharedWindow()
+
+        settings = dict(
+            api_class=api_class, markets=markets, interval=interval, window_size=window_size,
+            population_size=population_size, gene_size=gene_size, mutation_rate=mutation_rate,
+        )
+        # islands share this process' resource tracker, so their reads do not unlink the windows on exit
+        resource_tracker.ensure_running()
+        self.connections = []
+        self.processes = []
+        seeds = np.random.SeedSequence().spawn(islands)
+        for number in range(islands):
+            connection, child = multiprocessing.Pipe()
+            # islands append their own generation lines to the same metrics file
+            process = multiprocessing.Process(target=island, args=(child, settings, number, metrics.path, seeds[number]), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        atexit.register(self.close)
+
+    def close(self):
+        for connection in self.connections:
+            try: connection.send(('close',))
+            except (BrokenPipeError, OSError): pass
+        for process in self.processes: process.join()
+        self.connections, self.processes = [], []
+        self.shared.close()
+
+    def select_best(self):
+        return self.best
+
+    def function_best(self, template):
+        buy, _ = to_function(gene=self.best['buy'], template=template)
+        sell, stoploss = to_function(gene=self.best['sell'], template=template)
+        return buy, sell, stoploss
+
+    def run(self, data, template):
+        print(f'{provider.to_date(data[0, 0])} --> {provider.to_date(data[-1, 0])}')
+        start = time.perf_counter()
+
+        # exit
+        with self.metrics.stage('lock'):
+            with open('lock', 'r') as lock:
+                if lock.read(): sys.exit()
+
+        # one generation on every island at once
+        with self.metrics.stage('publish'):
+            self.shared.publish(data)
+        emigrants = self.migrants if (self.generation + 1) % self.migration_interval == 0 else 0
+        with self.metrics.stage('islands'):
+            for connection, immigrants in zip(self.connections, self.incoming):
+                connection.send(('run', self.shared.shm.name, data.shape, template, immigrants, emigrants))
+            # an island that saw the lock file has stopped, so does everything else
+            try: results = [connection.recv() for connection in self.connections]
+            except EOFError: sys.exit()
+
+        # ring migration, island n sends to island n + 1
+        self.incoming = [results[n - 1][1] for n in range(self.islands)]
+        self.best = max((best for best, _ in results), key=lambda n: n['perf'])
+        self.generation += 1
+
+        print(f'islands: {" ".join(f"{best['perf']:.2f}" for best, _ in results)}{"  migrated" if emigrants else ""}')
+        print(f'{self.best["perf"]=}')
+        self.metrics.count('migrants', emigrants * self.islands)
+        self.metrics.emit(
+            'archipelago', generation=self.generation, best=float(self.best['perf']),
+            islands=[float(best['perf']) for best, _ in results], seconds=time.perf_counter() - start,
+        )
 
         return self.function_best(template)
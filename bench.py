@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import pickle
+import tempfile
+import platform
+import contextlib
+import subprocess
+import numpy as np
+import algo
+import indicators
+import provider
+import stub
+import weatherlight
+
+
+# python bench.py [--repeat=N] [--out=bench_output.txt] [--compare=previous.json] [--only=name,name]
+# every stage runs on the bundled candles with seeded rngs, results are written as json
+SEED = 1
+DATA = {'1d': 'data/data-ETH-EUR-1d.dat', '6h': 'data/data-ETH-EUR-6h.dat'}
+WINDOW = 1440
+POPULATION = 100
+GENE_SIZE = 32
+
+
+def seed():
+    algo.rng = np.random.default_rng(SEED)
+
+
+def load(root, interval):
+    # stored as eth (timestamp, open, high, low, close, volume) followed by btc without timestamp
+    with open(os.path.join(root, DATA[interval]), 'rb') as fh:
+        data = pickle.load(fh)
+    return data, data[:, :6], np.c_[data[:, 0], data[:, 6:]]
+
+
+def measure(function, repeat, setup=None):
+    # setup runs before every repeat and is not timed, its result is passed on
+    times = []
+    for _ in range(repeat):
+        seed()
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': float(np.median(times)), 'repeat': repeat}
+
+
+def quiet(function):
+    def wrapper(*args):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return function(*args)
+    return wrapper
+
+
+def stages(root):
+    # name -> (function, setup), setup builds whatever the stage needs outside of the timing
+    data_1d, eth_1d, _ = load(root, '1d')
+    data_6h, eth_6h, btc_6h = load(root, '6h')
+    live_6h = weatherlight.apply_indicators(eth_6h)
+    features = weatherlight.FeatureStore(data_6h)
+    algo_window = weatherlight.algo_indicators(data_6h[-WINDOW:])
+    template = f'data[-1, (__number__ % {len(algo_window[-1]) - 1})+1]'
+
+    seed()
+    population = algo.Population.spawn(POPULATION, GENE_SIZE)
+    large = algo.Population.spawn(10000, GENE_SIZE)
+    large.perf = algo.rng.random(len(large)) * 1000
+
+    def cold_genes():
+        algo.decode_key.cache_clear()
+        algo.compile_key.cache_clear()
+        return ()
+
+    def signals():
+        return algo.signals(population.buy, algo_window, template), algo.signals(population.sell, algo_window, template)
+
+    buy, sell = signals()
+    stoploss = np.array([algo.decode(gene)[1] for gene in population.sell])
+
+    def node():
+        api = provider.TestClient(balance={'EUR': 1000.0})
+        api.set_data(algo_window[-200:])
+        return ({'buy': population.buy[0], 'sell': population.sell[0], 'perf': 0.0, 'api': api},)
+
+    def generation():
+        # a fresh population every time, nothing cached
+        cold_genes()
+        for fn in os.listdir('data'): os.remove(os.path.join('data', fn))
+        incubator = algo.Incubator(
+            api_class=provider.TestClient, markets=['ETH-EUR'], interval='6h', window_size=WINDOW,
+            population_size=POPULATION, gene_size=GENE_SIZE, mutation_rate=0.02,
+        )
+        return incubator, features.window(len(data_6h) - WINDOW, len(data_6h))
+
+    def step_loop():
+        api = provider.TestClient()
+        api.set_data(live_6h)
+        api.set_balance(balance={'EUR': 1000})
+        step_counter, step = -1, True
+        while step:
+            step_counter, step = api.step(step_counter, 1)
+            buy, sell = weatherlight.strategy(api, 'ETH-EUR', '6h', True)
+            quo, sym = float(api.available('EUR')), float(api.available('ETH'))
+            if buy: api.place_order(market='ETH-EUR', side='buy', order_type='market', amountQuote=quo)
+            if sell: api.place_order(market='ETH-EUR', side='sell', order_type='market', amount=sym)
+
+    exchange = stub.StubExchange({'ETH-EUR': eth_6h, 'BTC-EUR': btc_6h}).start()
+
+    def client():
+        return (provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter()),)
+
+    return {
+        # indicators
+        'indicators.sma': (lambda: indicators.sma(eth_6h, 360), None),
+        'indicators.rsi': (lambda: indicators.rsi(eth_6h, 24), None),
+        'weatherlight.apply_indicators': (lambda: weatherlight.apply_indicators(eth_6h), None),
+        'indicators.Stream.seed': (lambda: indicators.Stream(weatherlight.LIVE_INDICATORS).seed(eth_6h), None),
+        'weatherlight.algo_indicators': (lambda: weatherlight.algo_indicators(data_6h[-WINDOW:]), None),
+        'weatherlight.algo_features.1d': (lambda: weatherlight.algo_features(data_1d), None),
+        'weatherlight.algo_features.6h': (lambda: weatherlight.algo_features(data_6h), None),
+        'weatherlight.FeatureStore.window': (lambda: [features.window(n, n + WINDOW).shape for n in range(0, 100)], None),
+
+        # genes and evaluation, population of POPULATION on the last WINDOW candles
+        'algo.to_function': (lambda: [algo.to_function(gene, template) for gene in population.buy], cold_genes),
+        'algo.compile_gene': (lambda: [algo.compile_gene(gene, template) for gene in population.buy], cold_genes),
+        'algo.signals': (signals, cold_genes),
+        'algo.simulate': (lambda: algo.simulate(buy, sell, stoploss, algo_window[:, 4], 1000.0), None),
+        'algo.run_node': (quiet(lambda node: algo.run_node(node, 'ETH-EUR', template)), node),
+        'algo.Population.bookkeeping.10k': (lambda: large.replace(large.worst(2500), algo.breed(large, large.select(2500, 'best'), 2500, GENE_SIZE, 0.02)), None),
+        'algo.Incubator.run': (quiet(lambda incubator, window: incubator.run(window, template)), quiet(generation)),
+
+        # backtests
+        'weatherlight.backtest': (lambda: weatherlight.backtest(live_6h, *weatherlight.strategy_columns(live_6h), 1000), None),
+        'weatherlight.strategy.step_loop': (step_loop, None),
+
+        # provider, against the local stub exchange
+        'provider.align': (lambda: provider.align(eth_6h, btc_6h), None),
+        'provider.RestClient.get_data': (quiet(lambda api: api.get_data(['ETH-EUR', 'BTC-EUR'], '6h', 1440, -1)), client),
+    }, exchange
+
+
+def commit():
+    try: return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    repeat, out, compare, only = 5, os.path.join(root, 'bench_output.txt'), None, None
+    for arg in sys.argv:
+        if arg.startswith('--repeat='): repeat = int(arg.split('=')[1])
+        if arg.startswith('--out='): out = os.path.abspath(arg.split('=')[1])
+        if arg.startswith('--compare='): compare = os.path.abspath(arg.split('=')[1])
+        if arg.startswith('--only='): only = arg.split('=')[1].split(',')
+
+    previous = {}
+    if compare:
+        with open(compare, 'r') as fh: previous = json.load(fh)['results']
+
+    results = {}
+    cwd = os.getcwd()
+    # the incubator writes its checkpoint under data/ and reads the lock file, keep that out of the repo
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.mkdir('data')
+        open('lock', 'w').close()
+
+        table, exchange = stages(root)
+        try:
+            for name, (function, setup) in table.items():
+                if only and not any(part in name for part in only): continue
+                results[name] = measure(function, repeat, setup)
+                line = f'{name:36s} {results[name]["min"] * 1000:10.2f} ms  median {results[name]["median"] * 1000:10.2f} ms'
+                if name in previous: line += f'  x{results[name]["min"] / previous[name]["min"]:.2f}'
+                print(line)
+        finally:
+            exchange.stop()
+            os.chdir(cwd)
+
+    report = {
+        'commit': commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'seed': SEED,
+        'repeat': repeat,
+        'results': results,
+    }
+    with open(out, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
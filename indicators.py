@@ -1,33 +1,84 @@
+from collections import deque
 import numpy as np
 
 
 # helper function
-def calculate_sma(data, period):
-    result = np.empty((len(data), 1,))
-    result[:] = np.nan
+def window_sum(values, periods):
+    # sum of the `period` values before each row, one column per period
+    # rows without a full window (or with a nan in it) are nan
+    values = np.asarray(values, dtype=float).reshape(-1)
+    periods = np.asarray(periods, dtype=int).reshape(-1)
+    length = len(values)
+    result = np.full((length, len(periods)), np.nan)
+
+    nan = np.isnan(values)
+    total = np.zeros(length + 1)
+    np.cumsum(np.where(nan, 0.0, values), out=total[1:])
+    missing = np.zeros(length + 1, dtype=np.int64)
+    np.cumsum(nan, out=missing[1:])
+
+    for i, period in enumerate(periods):
+        if period > length: continue
+        column = result[period:, i]
+        column[:] = total[period:length] - total[0:length - period]
+        column[missing[period:length] != missing[0:length - period]] = np.nan
 
-    for n in range(len(data)):
-        if period > n: continue
-        result[n, 0] = data[n-period:n].sum() / period
-    
     return result
 
 
 # helper function
-def calculate_ema(data, period):
-    result = np.empty((len(data), 1,))
-    result[:] = np.nan
+def calculate_sma(data, period):
+    return sma_block(data, [period])
 
-    for n in range(len(data)):
-        if data[n] == np.nan: continue
-        if data[n-1] == np.nan: continue
 
-        p = data[n]
-        a = 2 / (1 + period)
+def sma_block(values, periods):
+    periods = np.asarray(periods, dtype=int).reshape(-1)
+    return window_sum(values, periods) / periods
+
+
+def ema_block(values, periods):
+    # ema() appends the sma column, the block keeps that behaviour
+    return sma_block(values, periods)
+
+
+def rsi_block(values, periods):
+    values = np.asarray(values, dtype=float).reshape(-1)
+    diff = np.zeros(len(values))
+    diff[1:] = values[1:] - values[:-1]
+
+    # nan differences count as no movement
+    diff_up = np.where(diff > 0, diff, 0.0)
+    diff_down = np.where(0 > diff, -diff, 0.0)
+
+    periods = np.asarray(periods, dtype=int).reshape(-1)
+    mean_up = window_sum(diff_up, periods) / periods
+    mean_down = window_sum(diff_down, periods) / periods
+
+    rs = np.divide(mean_up, mean_down, out=mean_up.copy(), where=mean_down != 0.0)
+    return 100 - (100 / (1 + rs))
 
-        result[n] = (p * a) + (result[n-1] * (1 - a))
-    
-    return result
+
+def rsi_last(values, period):
+    # rsi_block(values[:, c], [period])[-1] for every column c of a block of period + 1 rows,
+    # in one pass and with the same float operations
+    values = np.asarray(values, dtype=float)
+    diff = np.zeros_like(values)
+    diff[1:] = values[1:] - values[:-1]
+
+    # the sum of the `period` differences before the last row, accumulated in order like window_sum
+    mean_up = np.cumsum(np.where(diff[:-1] > 0, diff[:-1], 0.0), axis=0)[-1] / period
+    mean_down = np.cumsum(np.where(0 > diff[:-1], -diff[:-1], 0.0), axis=0)[-1] / period
+
+    rs = np.divide(mean_up, mean_down, out=mean_up.copy(), where=mean_down != 0.0)
+    return 100 - (100 / (1 + rs))
+
+
+def trim(data):
+    # drop the leading rows that still contain a nan
+    if not data.size: return data
+    complete = ~np.isnan(data).any(axis=1)
+    if not complete.any(): return data[len(data):]
+    return data[complete.argmax():]
 
 
 def sma(data, period, column=4):
@@ -37,32 +88,97 @@ def sma(data, period, column=4):
 
 def ema(data, period, column=4):
     _sma = calculate_sma(data[:, column], period)
-    _ema = calculate_ema(_sma, period)
     return np.c_[data, _sma]
 
 
 def rsi(data, period, column=4):
-    result = np.empty((len(data), 1,))
-    result[:] = np.nan
-
-    diff_up = np.array([0.0] * len(data))
-    diff_down = np.array([0.0] * len(data))
-    for n in range(len(data)):
-        if n == 0: continue
-        diff = data[n, column] - data[n-1, column]
-        if diff > 0: diff_up[n] = abs(diff)
-        if 0 > diff: diff_down[n] = abs(diff)
-    
-    for n in range(len(data)):
-        if period > n: continue
-        mean_up = diff_up[n-period:n].mean()
-        mean_down = diff_down[n-period:n].mean()
+    result = rsi_block(data[:, column], [period])
+    return np.c_[data, result]
+
+
+class StreamSMA:
+    # incremental sma(), fed one value per closed candle
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+        self.missing = 0
+        self.pushed = 0
+
+    def update(self, value):
+        # value for the new row: mean of the `period` values before it
+        if len(self.window) < self.period or self.missing:
+            result = np.nan
+        else:
+            result = self.total / self.period
+
+        if len(self.window) == self.period:
+            dropped = self.window.popleft()
+            if np.isnan(dropped): self.missing -= 1
+            else: self.total -= dropped
+
+        self.window.append(value)
+        if np.isnan(value): self.missing += 1
+        else: self.total += value
+
+        # resum now and then, so the running total does not drift
+        self.pushed += 1
+        if self.pushed % self.period == 0:
+            self.total = float(np.nansum(self.window))
+
+        return result
+
+
+class StreamEMA(StreamSMA):
+    # ema() appends the sma column, the stream follows it
+    pass
+
+
+class StreamRSI:
+    # incremental rsi()
+    def __init__(self, period):
+        self.period = period
+        self.up = StreamSMA(period)
+        self.down = StreamSMA(period)
+        self.previous = None
+
+    def update(self, value):
+        diff = 0.0 if self.previous is None else value - self.previous
+        self.previous = value
+
+        mean_up = self.up.update(diff if diff > 0 else 0.0)
+        mean_down = self.down.update(-diff if 0 > diff else 0.0)
 
         if mean_down == 0.0:
             rs = mean_up
         else:
             rs = mean_up / mean_down
-        
-        result[n] = 100 - (100 / (1 + rs))
-    
-    return np.c_[data, result]
+
+        return 100 - (100 / (1 + rs))
+
+
+STREAMS = {sma: StreamSMA, ema: StreamEMA, rsi: StreamRSI}
+
+
+class Stream:
+    # streaming counterpart of applying (func, period[, column]) indicators in order
+    def __init__(self, indicator_list):
+        self.columns = []
+        self.streams = []
+        for func, period, *column in indicator_list:
+            self.columns.append(column[0] if column else 4)
+            self.streams.append(STREAMS[func](period))
+        self.row = None
+
+    def update(self, candle):
+        row = np.empty(len(candle) + len(self.streams))
+        row[:len(candle)] = candle
+        for i, (column, stream) in enumerate(zip(self.columns, self.streams)):
+            row[len(candle) + i] = stream.update(row[column])
+        self.row = row
+        return row
+
+    def seed(self, data):
+        for candle in data:
+            self.update(candle)
+        return self.row
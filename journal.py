@@ -0,0 +1,77 @@
+import os
+import atexit
+import numpy as np
+import provider
+import store
+
+
+SIDES = ('buy', 'sell')
+TRADE_HEADER = 'date,price,worth,side,quote,symbol\n'
+
+
+class Journal:
+    # trades and the equity curve kept in columns and written in batches, instead of a file open per trade
+    # trades: `<path>.csv`, one line per order with the quote and symbol amounts before it and the worth after it
+    # equity: `<path>-equity.bin`, a CandleStore with (timestamp, price, worth) per candle, read back with .equity_curve()
+    # everything still buffered is written on flush(), close() and at exit, so a run stopped by the lock file keeps it
+    def __init__(self, path: str, batch: int = 1024, append: bool = False):
+        self.path = path
+        self.batch = batch
+        self.trades = np.empty((batch, 6)) # timestamp, side, price, quote, symbol, worth
+        self.equity = np.empty((batch, 3)) # timestamp, price, worth
+        self.n_trades = 0
+        self.n_equity = 0
+        self.store = store.CandleStore(f'{path}-equity.bin')
+
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not append or not os.path.exists(f'{path}.csv'):
+            with open(f'{path}.csv', 'w') as fh: fh.write(TRADE_HEADER)
+        if not append or not self.store.exists():
+            self.store.write(np.empty((0, 3)))
+
+        self.closed = False
+        atexit.register(self.close)
+
+    def trade(self, timestamp, side, price, quote, symbol, worth):
+        if self.n_trades == self.batch: self.flush_trades()
+        self.trades[self.n_trades] = timestamp, SIDES.index(side), price, quote, symbol, worth
+        self.n_trades += 1
+
+    def point(self, timestamp, price, worth):
+        # one candle of the equity curve
+        if self.n_equity == self.batch: self.flush_equity()
+        self.equity[self.n_equity] = timestamp, price, worth
+        self.n_equity += 1
+
+    def curve(self, timestamps, prices, worths):
+        # a whole stretch of the equity curve at once, after what is buffered
+        self.flush_equity()
+        self.store.append(np.c_[timestamps, prices, worths])
+
+    def flush_trades(self):
+        if not self.n_trades: return
+        lines = [
+            f'{provider.to_date(timestamp)},{price},{worth},{SIDES[int(side)]},{quote},{symbol}\n'
+            for timestamp, side, price, quote, symbol, worth in self.trades[:self.n_trades].tolist()
+        ]
+        with open(f'{self.path}.csv', 'a') as fh: fh.write(''.join(lines))
+        self.n_trades = 0
+
+    def flush_equity(self):
+        if not self.n_equity: return
+        self.store.append(self.equity[:self.n_equity])
+        self.n_equity = 0
+
+    def flush(self):
+        self.flush_trades()
+        self.flush_equity()
+
+    def equity_curve(self):
+        self.flush_equity()
+        return self.store.read()
+
+    def close(self):
+        if self.closed: return
+        self.flush()
+        self.closed = True
+        atexit.unregister(self.close)
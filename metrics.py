@@ -0,0 +1,185 @@
+import json
+import time
+import bisect
+import threading
+
+
+class Stage:
+    # adds the wall time of a with block to a stage of the open record
+    __slots__ = ('record', 'name', 'start')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.record[self.name] = self.record.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class Idle:
+    # what a disabled Metrics hands out, does nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+IDLE = Idle()
+
+
+class Metrics:
+    # per-stage wall time and counters, written as one json line per emit()
+    # without a path every call returns right away
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.enabled = path is not None
+        self.stages = {}
+        self.counters = {}
+        self.fh = open(path, 'a') if self.enabled else None
+
+    def stage(self, name):
+        if not self.enabled: return IDLE
+        return Stage(self.stages, name)
+
+    def count(self, name, value=1):
+        if not self.enabled: return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def emit(self, kind, **fields):
+        # one line with everything recorded since the last emit, then start over
+        if not self.enabled: return
+        record = {'kind': kind, 'time': time.time(), **fields, 'stages': self.stages, 'counters': self.counters}
+        self.fh.write(json.dumps(record) + '\n')
+        self.fh.flush()
+        self.stages, self.counters = {}, {}
+        return record
+
+    def scope(self):
+        # its own stages and counters, written to the same file
+        scope = Metrics()
+        scope.path, scope.enabled, scope.fh = self.path, self.enabled, self.fh
+        return scope
+
+    def close(self):
+        if self.fh is not None: self.fh.close()
+        self.fh = None
+        self.enabled = False
+
+
+disabled = Metrics()
+
+
+# upper bounds of the latency buckets in seconds, the last one catches the rest
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, float('inf'))
+
+
+class Histogram:
+    # fixed buckets, quantiles are read as the upper bound of the bucket they fall in
+    __slots__ = ('bounds', 'buckets', 'count', 'total', 'low', 'high')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+        self.low = float('inf')
+        self.high = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.low: self.low = value
+        if value > self.high: self.high = value
+
+    def quantile(self, q):
+        if not self.count: return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.buckets):
+            seen += n
+            if seen >= rank: return min(bound, self.high)
+        return self.high
+
+    def summary(self):
+        if not self.count: return {'count': 0}
+        return {
+            'count': self.count, 'mean': self.total / self.count, 'min': self.low, 'max': self.high,
+            'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99),
+            'buckets': {str(bound): n for bound, n in zip(self.bounds, self.buckets) if n},
+        }
+
+
+class Endpoint:
+    # everything recorded for one `METHOD /path`
+    __slots__ = ('latency', 'requests', 'bytes', 'waits', 'waited', 'errors')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.bytes = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.errors = {}
+
+    def summary(self):
+        return {
+            'requests': self.requests, 'bytes': self.bytes, 'waits': self.waits, 'waited': self.waited,
+            'errors': dict(self.errors), 'latency': self.latency.summary(),
+        }
+
+
+class RequestMetrics:
+    # latency, bytes received, rate limit waits and errors per endpoint of a RestClient
+    # recorded from the download threads as well, so every update holds the lock
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def endpoint(self, name):
+        endpoint = self.endpoints.get(name)
+        if endpoint is None: endpoint = self.endpoints.setdefault(name, Endpoint())
+        return endpoint
+
+    def record(self, name, seconds, size, status, waited=0.0):
+        with self.lock:
+            endpoint = self.endpoint(name)
+            endpoint.requests += 1
+            endpoint.latency.add(seconds)
+            endpoint.bytes += size
+            if waited:
+                endpoint.waits += 1
+                endpoint.waited += waited
+            if status != 200: endpoint.errors[str(status)] = endpoint.errors.get(str(status), 0) + 1
+
+    def error(self, name, exception, waited=0.0):
+        # the request never got a response
+        with self.lock:
+            endpoint = self.endpoint(name)
+            endpoint.requests += 1
+            if waited:
+                endpoint.waits += 1
+                endpoint.waited += waited
+            kind = type(exception).__name__
+            endpoint.errors[kind] = endpoint.errors.get(kind, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {name: endpoint.summary() for name, endpoint in sorted(self.endpoints.items())}
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def export(self, recorder: Metrics, reset: bool = True, **fields):
+        # one 'requests' line in a Metrics file, by default counting from zero again after it
+        with self.lock:
+            endpoints = {name: endpoint.summary() for name, endpoint in sorted(self.endpoints.items())}
+            if reset: self.endpoints = {}
+        return recorder.emit('requests', **fields, endpoints=endpoints)
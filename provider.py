@@ -1,26 +1,208 @@
 import os
+import copy
+import json
 import requests
 import hashlib
 import hmac
 import time
-from datetime import datetime
+import heapq
+import asyncio
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 import numpy as np
+import metrics
 
 
 API_LIMIT_MINIMUM = 100
+INTERVAL_UNITS = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'W': 7 * 24 * 60 * 60 * 1000, 'M': 31 * 24 * 60 * 60 * 1000}
 
 
 def to_date(timestamp):
     return datetime.fromtimestamp(timestamp/1000).strftime('%Y-%m-%d %H:%M:%S')
 
 
+def interval_ms(interval):
+    # candle length of an interval string like '1h', '6h' or '1d'
+    # months count as 31 days, use candle_close() where the real length matters
+    return int(interval[:-1]) * INTERVAL_UNITS[interval[-1]]
+
+
+def candle_close(opened, interval):
+    # close time (ms) of candles opened at `opened` (ms, scalar or array), months follow the calendar
+    if interval[-1] == 'M':
+        months = np.asarray(opened, dtype=np.int64).astype('datetime64[ms]').astype('datetime64[M]') + np.timedelta64(int(interval[:-1]), 'M')
+        return months.astype('datetime64[ms]').astype(np.int64)
+    return np.asarray(opened, dtype=np.int64) + interval_ms(interval)
+
+
+def next_close(now, interval):
+    # close time (ms) of the candle running at `now` (ms), candles are aligned to the epoch
+    # weeks start on monday, months on the first
+    if interval[-1] == 'M':
+        date = datetime.fromtimestamp(now / 1000, tz=timezone.utc)
+        month = date.month - 1 + int(interval[:-1])
+        return int(datetime(date.year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    length = interval_ms(interval)
+    offset = 4 * INTERVAL_UNITS['d'] if interval[-1] == 'W' else 0
+    return ((int(now) - offset) // length + 1) * length + offset
+
+
+class Clock:
+    # wall clock for the live loop, SimClock replaces it in simulations
+    def time(self):
+        return time.time()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(max(seconds, 0))
+
+
+class SimClock(Clock):
+    # simulated time, sleepers wait until step() moves the time to their wake-up
+    def __init__(self, now: float):
+        self.now = now
+        self.sleepers = []
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.slept.append(seconds)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.sleepers, (self.now + max(seconds, 0), id(future), future))
+        await future
+
+    def step(self):
+        # jump to the earliest wake-up and release every sleeper due by then
+        if not self.sleepers: return False
+        self.now = max(self.now, self.sleepers[0][0])
+        while self.sleepers and self.sleepers[0][0] <= self.now:
+            heapq.heappop(self.sleepers)[2].set_result(None)
+        return True
+
+
+def unique(data):
+    # one row per timestamp, sorted
+    _, index = np.unique(data[:, 0], return_index=True)
+    return data[index]
+
+
+def align(data, new_data):
+    # append new_data's columns to the rows of data with the same timestamp, nan where there is none
+    # sorted join: O((n + m) log m) instead of scanning new_data for every row
+    result = np.full((len(data), new_data.shape[1] - 1), np.nan)
+    if len(new_data):
+        order = np.argsort(new_data[:, 0], kind='stable')
+        timestamps = new_data[order, 0]
+        index = np.searchsorted(timestamps, data[:, 0])
+        index[index == len(timestamps)] = 0
+        match = timestamps[index] == data[:, 0]
+        result[match] = new_data[order[index[match]], 1:]
+    return np.c_[data, result]
+
+
+class RateLimiter:
+    # weight budget shared by every client in the process, refilled when the exchange window resets
+    # bulk traffic leaves `reserve` weight for orders and yields to orders that are waiting
+    def __init__(self, limit: int = 1000, reserve: int = API_LIMIT_MINIMUM, window: float = 60.0, clock=time.time):
+        self.limit = limit
+        self.reserve = reserve
+        self.window = window
+        self.clock = clock
+        self.remaining = limit
+        self.reset_at = 0.0
+        self.exchange_reset_at = 0.0
+        self.orders_waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, weight: int = 1, priority: bool = False):
+        # blocks until the weight fits, returns the seconds spent waiting
+        start, waited = self.clock(), False
+        with self.condition:
+            if priority: self.orders_waiting += 1
+            try:
+                while True:
+                    now = self.clock()
+                    if now >= self.reset_at:
+                        self.remaining = self.limit
+                        self.reset_at = now + self.window
+
+                    floor = 0 if priority else self.reserve
+                    if self.remaining - weight >= floor and (priority or not self.orders_waiting):
+                        self.remaining -= weight
+                        return self.clock() - start if waited else 0.0
+
+                    self.condition.wait(max(self.reset_at - now, 0.001))
+                    waited = True
+            finally:
+                if priority: self.orders_waiting -= 1
+                self.condition.notify_all()
+
+    def update(self, headers):
+        # the exchange's numbers win over the local estimate
+        with self.condition:
+            if 'bitvavo-ratelimit-limit' in headers:
+                self.limit = int(headers['bitvavo-ratelimit-limit'])
+            if 'bitvavo-ratelimit-remaining' in headers:
+                remaining = int(headers['bitvavo-ratelimit-remaining'])
+                reset_at = int(headers.get('bitvavo-ratelimit-resetat', 0)) / 1000
+                if reset_at > self.exchange_reset_at:
+                    # new window on the exchange
+                    self.remaining, self.reset_at, self.exchange_reset_at = remaining, reset_at, reset_at
+                elif reset_at == self.exchange_reset_at:
+                    # same window, other requests may be in flight
+                    self.remaining = min(self.remaining, remaining)
+            self.condition.notify_all()
+            return self.remaining
+
+
+shared_limiter = RateLimiter()
+
+
+def endpoint_name(method, endpoint):
+    # `GET /ETH-EUR/candles?interval=1h` -> `GET /{market}/candles`
+    path = endpoint.split('?')[0]
+    if path.endswith('/candles'): path = '/{market}/candles'
+    return f'{method} {path}'
+
+
 class RestClient:
-    def __init__(self, api_key: str, api_secret: str, access_window: int = 10000):
+    def __init__(self, api_key: str, api_secret: str, access_window: int = 10000, base: str = 'https://api.bitvavo.com/v2', workers: int = 4, limiter: RateLimiter | None = None, verbose: bool = True, request_metrics: metrics.RequestMetrics | None = None):
         self.api_key = api_key
         self.api_secret = api_secret
         self.access_window = access_window
-        self.base = 'https://api.bitvavo.com/v2'
+        self.base = base
         self.limit = 0
+        self.limiter = limiter or shared_limiter
+
+        # per-endpoint latency, bytes, waits and errors, printing each request is optional
+        self.verbose = verbose
+        self.metrics = request_metrics or metrics.RequestMetrics()
+
+        # keep-alive connections, shared by concurrent page downloads
+        self.workers = workers
+        self.session = requests.Session()
+        self.session.mount(base, HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+
+        # signing material that does not change per request: the keyed hmac is copied, not rebuilt
+        # and the constant headers live on the session
+        self.signer = hmac.new(api_secret.encode('utf-8'), digestmod=hashlib.sha256)
+        self.prefix = urlparse(base).path.rstrip('/')
+        self.session.headers.update({
+            'bitvavo-access-key': api_key,
+            'bitvavo-access-window': str(access_window),
+        })
+        self.pool = None
+
+    def scope(self):
+        # the same connections and rate limiter, with request metrics of its own
+        scope = copy.copy(self)
+        scope.metrics = metrics.RequestMetrics()
+        return scope
 
     def place_order(self, market: str, side: str, order_type: str, amount: float | None = None, amountQuote: float | None = None):
         """
@@ -39,137 +221,272 @@ class RestClient:
         if amount: body['amount'] = str(amount)
         if amountQuote: body['amountQuote'] = str(amountQuote)
 
-        return self.__request(method='POST', endpoint='/order', body=body)
+        return self.__request(method='POST', endpoint='/order', body=body, priority=True)
 
     def get_trades(self, market: str = ''):
-        return self.__request(endpoint=f'/trades?market={market}', method='GET')
+        return self.__request(endpoint=f'/trades?market={market}', method='GET', weight=5)
 
     def get_balance(self, symbol: str = ''):
         if symbol:
-            return self.__request(endpoint=f'/balance?symbol={symbol}', method='GET')
+            return self.__request(endpoint=f'/balance?symbol={symbol}', method='GET', weight=5)
         else:
-            return self.__request(endpoint=f'/balance', method='GET')
+            return self.__request(endpoint=f'/balance', method='GET', weight=5)
+
+    def available(self, symbol: str):
+        # available amount of one symbol, 0 when the account has none
+        try: return float(self.get_balance(symbol)[0]['available'])
+        except (IndexError, KeyError, TypeError): return 0.0
 
-    def get_data(self, markets, interval, amount=1440, number=1):
+    def account(self, market: str):
+        # (quote available, symbol available, last buy price) for one decision
+        # all balances and the trades in one concurrent batch, instead of three requests in a row
+        symbol, quote = market.split('-')
+        if self.pool is None: self.pool = ThreadPoolExecutor(max_workers=2)
+        trades = self.pool.submit(self.last_buy_price, market)
+        balance = {b.get('symbol'): b for b in self.get_balance() or []}
+
+        def available(symbol):
+            try: return float(balance[symbol]['available'])
+            except (KeyError, TypeError): return 0.0
+
+        return available(quote), available(symbol), trades.result()
+
+    def warm(self, connections: int = 2):
+        # open (or keep open) `connections` pooled connections before a decision, so the
+        # requests right after a candle close do not pay for the handshake
+        if self.pool is None: self.pool = ThreadPoolExecutor(max_workers=2)
+        pending = [self.pool.submit(self.get_time) for _ in range(connections - 1)]
+        self.get_time()
+        for request in pending: request.result()
+
+    def get_time(self):
+        return self.__request(endpoint='/time', method='GET')
+
+    def last_buy_price(self, market: str):
+        # price of the most recent buy in `market`, 0 when there is none
+        for trade in self.get_trades(market):
+            if trade.get('side', '') == 'buy': return float(trade.get('price', 0.0))
+        return 0.0
+
+    def get_data(self, markets, interval, amount=1440, number=1, since=None, now=None):
         main_market = markets[0]
         data = None
         for market in markets:
-            new_data = self.get_market(market, interval, amount, number)
+            new_data = self.get_market(market, interval, amount, number, since, now)
             if market == main_market:
                 data = new_data.copy()
                 continue
 
-            n = new_data.shape[1] - 1
-            col = np.empty((len(data), n,))
-            col[:] = np.nan
-            data = np.c_[data, col]            
-
-            for date in data[:, 0]:
-                match = data[:, 0] == date
-                match_new = new_data[:, 0] == date
-
-                match = np.where(match)[0]
-                match_new = np.where(match_new)[0]
-
-                if not len(match): continue # this should never happen
-                if not len(match_new): continue # not found
-                
-                r = match[0]
-                r_new = match_new[0]
-
-                data[r, 0-n:] = new_data[r_new, 1:]
+            data = align(data, new_data)
         
+        if since is not None: return data
         return data[:-1]
 
-    def get_market(self, market, interval, amount=1440, number=1):
+    def get_market(self, market, interval, amount=1440, number=1, since=None, now=None):
+        if since is not None: return self.get_market_since(market, interval, since, amount, now)
         if number == -1: number = 999999
-        h_start, h_end = 0, 0
-        
-        data = np.array([])
-        for n in range(number):
-            if len(data):
-                end = int(data[-1][0])
-                start = int(end - (24*60*60*60*999))
-                if start == h_start and end == h_end: break
-                h_start, h_end = start, end
-                response = self.__request(endpoint=f'/{market}/candles?interval={interval}&limit={amount}&start={start}&end={end}', method='GET')
-            else:
-                response = self.__request(endpoint=f'/{market}/candles?interval={interval}&limit={amount}', method='GET')
-            
-            new_data = np.array(response).astype(float)
-            if len(data):
-                data = np.concatenate((data, new_data))
-            else:
-                data = new_data
-
-        data = np.unique(data, axis=0)
-        data = data[data[:, 0].argsort()]
+        endpoint = f'/{market}/candles?interval={interval}&limit={amount}'
+
+        pages = [self.get_candles(endpoint)]
+        if len(pages[0]) and number > 1:
+            # page n covers the `amount` candles before page n-1, so every page range is known up front
+            # fetch them in batches of `workers` until history runs out
+            span = amount * interval_ms(interval)
+            oldest = int(pages[0][:, 0].min())
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                n = 1
+                while n < number:
+                    batch = range(n, min(n + self.workers, number))
+                    endpoints = [f'{endpoint}&start={oldest - page * span}&end={oldest - (page - 1) * span}' for page in batch]
+                    new_pages = list(pool.map(self.get_candles, endpoints))
+                    pages.extend(new_pages)
+                    n += len(batch)
+                    if not all(len(page) for page in new_pages): break
+
+        data = unique(np.concatenate(pages))
         
         return data[:-1]
 
-    def __request(self, endpoint: str, body: dict | None = None, method: str = 'GET'):
+    def get_market_since(self, market, interval, since, amount=1440, now=None):
+        # only the candles closed after `since` (by `now`, ms), in pages laid out forward from it
+        length = interval_ms(interval)
+        span = amount * length
+        now = int(time.time() * 1000 if now is None else now)
+        endpoint = f'/{market}/candles?interval={interval}&limit={amount}'
+        endpoints = [f'{endpoint}&start={start}&end={start + span - 1}' for start in range(int(since) + 1, now + 1, span)]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pages = list(pool.map(self.get_candles, endpoints))
+
+        data = unique(np.concatenate([np.empty((0, 6))] + pages))
+        return data[candle_close(data[:, 0], interval) <= now]
+
+    def get_candles(self, endpoint):
+        # an empty page means the history ran out, so a failed request raises instead of looking like one
+        response = self.__request(endpoint=endpoint, method='GET', strict=True)
+        if not response: return np.empty((0, 6))
+        return np.array(response).astype(float)
+
+    def __request(self, endpoint: str, body: dict | None = None, method: str = 'GET', weight: int = 1, priority: bool = False, strict: bool = False):
         """
         Create the headers to authenticate your request, then make the call to Bitvavo API.
         :param endpoint: the endpoint you are calling. For example, `/order`.
         :param body: for GET requests, this can be an empty string. For all other methods, a string
                      representation of the call body.
         :param method: the HTTP method of the request.
+        :param weight: the rate limit weight of the endpoint.
+        :param priority: order traffic, may use the weight bulk requests leave in reserve.
+        :param strict: raise requests.HTTPError on anything but a 200, instead of returning None.
         """
-        print(f'____       {method} {self.base}{endpoint}', end='')
+        if self.verbose: print(f'____       {method} {self.base}{endpoint}', end='')
+        waited = self.limiter.acquire(weight, priority)
         now = int(time.time() * 1000)
-        sig = self.__signature(now, method, endpoint, body)
+        data = json.dumps(body, separators=(',', ':')) if body else None
         url = self.base + endpoint
         headers = {
-            'bitvavo-access-key': self.api_key,
-            'bitvavo-access-signature': sig,
+            'bitvavo-access-signature': self.__signature(now, method, endpoint, data),
             'bitvavo-access-timestamp': str(now),
-            'bitvavo-access-window': str(self.access_window),
         }
-        response = requests.request(method=method, url=url, headers=headers, json=body)
+        if data: headers['Content-Type'] = 'application/json'
+        name = endpoint_name(method, endpoint)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method=method, url=url, headers=headers, data=data)
+        except requests.RequestException as e:
+            self.metrics.error(name, e, waited)
+            if self.verbose: print(f' [ERROR] {e!r}')
+            raise
+        self.metrics.record(name, time.perf_counter() - start, len(response.content), response.status_code, waited)
         
-        if 'bitvavo-ratelimit-remaining' in response.headers:
-            self.limit = int(response.headers['bitvavo-ratelimit-remaining'])
-        print(f'\r{self.limit:04d}   ', end='')
-        if API_LIMIT_MINIMUM > self.limit:
-            print(f'\r{self.limit:04d} * ', end='')
-            time.sleep(60)
-
-        print(response.status_code)
+        self.limit = self.limiter.update(response.headers)
+        if self.verbose:
+            print(f'\r{self.limit:04d} {"*" if waited else " "} ', end='')
+            print(response.status_code)
 
         if response.status_code == 200:
             return response.json()
-        else:
-            print(f'[ERROR] {response.json()}', end='')
-        
-        print()
+        if self.verbose:
+            print(f'[ERROR] {response.text}', end='')
+            print()
+        if strict:
+            raise requests.HTTPError(f'{response.status_code} {method} {endpoint}: {response.text}', response=response)
 
-    def __signature(self, timestamp: int, method: str, url: str, body: dict | None):
+    def __signature(self, timestamp: int, method: str, url: str, body: str | None):
         """
         Create a hashed code to authenticate requests to Bitvavo API.
         :param timestamp: a unix timestamp showing the current time.
         :param method: the HTTP method of the request.
         :param url: the endpoint you are calling. For example, `/order`.
-        :param body: for GET requests, this can be an empty string. For all other methods, a string
-                     representation of the call body. For example, for a call to `/order`:
-                     `{"market":"BTC-EUR","side":"buy","price":"5000","amount":"1.23", "orderType":"limit"}`.
+        :param body: for GET requests, None. For all other methods, the exact json that is sent.
+                     For example, for a call to `/order`:
+                     `{"market":"BTC-EUR","side":"buy","price":"5000","amount":"1.23","orderType":"limit"}`.
         """
-        string = str(timestamp) + method + '/v2' + url
-        if (body is not None) and (len(body.keys()) != 0):
-            string += '{' + ','.join([f'"{k}":"{v}"' for k, v in body.items()]) + '}'
-        signature = hmac.new(self.api_secret.encode('utf-8'), string.encode('utf-8'), hashlib.sha256).hexdigest()
-        return signature
+        signer = self.signer.copy()
+        signer.update(f'{timestamp}{method}{self.prefix}{url}{body or ""}'.encode('utf-8'))
+        return signer.hexdigest()
+
+
+class Ledger:
+    # trades in preallocated columns, oldest first, the arrays double when full
+    SIDES = ('buy', 'sell')
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.timestamp = np.zeros(capacity, dtype=np.int64)
+        self.market = np.zeros(capacity, dtype=np.int32)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.values = np.zeros((capacity, 3)) # amount, price, fee
+        self.markets = {}
+        self.names = []
+        self.last = {} # (market, side) -> row of the latest trade
+
+    def grow(self):
+        capacity = 2 * len(self.timestamp)
+        for name in ('timestamp', 'market', 'side', 'values'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, timestamp, market, side, amount, price, fee):
+        if self.size == len(self.timestamp): self.grow()
+        if market not in self.markets:
+            self.markets[market] = len(self.names)
+            self.names.append(market)
+
+        row = self.size
+        self.timestamp[row] = timestamp
+        self.market[row] = self.markets[market]
+        self.side[row] = self.SIDES.index(side)
+        self.values[row] = amount, price, fee
+        self.last[market, side] = row
+        self.size += 1
+        return row
+
+    def last_price(self, market, side='buy'):
+        row = self.last.get((market, side))
+        return 0.0 if row is None else float(self.values[row, 1])
+
+    def trade(self, row):
+        amount, price, fee = self.values[row]
+        return {
+            'timestamp': str(self.timestamp[row]),
+            'side': self.SIDES[self.side[row]],
+            'market': self.names[self.market[row]],
+            'amount': float(amount),
+            'price': float(price),
+            'fee': float(fee),
+        }
+
+    def trades(self, market=''):
+        # the api shape: dicts, newest first, only built for the trades that are looked at
+        rows = np.arange(self.size)[::-1]
+        if market:
+            rows = rows[self.market[rows] == self.markets.get(market, -1)]
+        return TradeView(self, rows)
+
+    def __len__(self):
+        return self.size
+
+
+class TradeView(Sequence):
+    # read-only list of trade dicts on top of the ledger rows
+    def __init__(self, ledger, rows):
+        self.ledger = ledger
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return [self.ledger.trade(row) for row in self.rows[index]]
+        return self.ledger.trade(self.rows[index])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.ledger.trade(row)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class TestClient(RestClient):
     def __init__(self, api_key: str = '', api_secret: str = '', access_window: int = 10000, balance = {}):
         super().__init__(api_key, api_secret, access_window)
         self.balance = balance
-        self.trades = []
+        self.ledger = Ledger()
         self.data = None
         self.current = None
 
+    @property
+    def trades(self):
+        return self.ledger.trades()
+
     def place_order(self, market: str, side: str, order_type: str, amount: float | None = None, amountQuote: float | None = None):
-        now = str(int(time.time() * 1000))
+        now = int(time.time() * 1000)
 
         symbol, quote = market.split('-')
         price = self.current[-1, 4] # close
@@ -189,34 +506,28 @@ class TestClient(RestClient):
             self.balance[symbol] = self.balance.get(symbol, 0) - amount
             self.balance[quote] = self.balance.get(quote, 0) + amountQuote
 
-        trade = {
-            'timestamp': now,
-            'side': side,
-            'market': market,
-            'amount': amount,
-            'price': price,
-            'fee': fee,
-        }
-        self.trades = [trade] + self.trades
-        return trade
+        return self.ledger.trade(self.ledger.add(now, market, side, amount, price, fee))
 
     def get_trades(self, market: str = ''):
-        trades = []
-        for trade in self.trades:
-            if market and not trade['market'] == market: continue
-            trades.append(trade)
-        return trades
+        return self.ledger.trades(market)
 
     def get_balance(self, symbol: str = ''):
-        balances = [{'symbol': symbol, 'available': amount} for symbol, amount in self.balance.items()]
-        if symbol:
-            for balance in balances:
-                if balance['symbol'] == symbol: return [balance]
-            else:
-                self.balance[symbol] = 0
-                return [{'symbol': symbol, 'available': 0}]
-        else:
-            return balances
+        if symbol: return [{'symbol': symbol, 'available': self.available(symbol)}]
+        return [{'symbol': symbol, 'available': amount} for symbol, amount in self.balance.items()]
+
+    def available(self, symbol: str):
+        # unknown symbols are opened at 0, like get_balance did
+        return self.balance.setdefault(symbol, 0)
+
+    def last_buy_price(self, market: str):
+        return self.ledger.last_price(market, 'buy')
+
+    def account(self, market: str):
+        symbol, quote = market.split('-')
+        return self.available(quote), self.available(symbol), self.last_buy_price(market)
+
+    def warm(self, connections: int = 2):
+        pass
 
     def get_data(self, *args, **kwargs):
         return self.current
@@ -236,7 +547,7 @@ class TestClient(RestClient):
             return counter, True
 
     def net_worth(self, symbol):
-        return float(self.current[-1, 4] * float(self.get_balance(symbol=symbol)[0]['available'])) + float(self.get_balance(symbol='EUR')[0]['available'])
+        return float(self.current[-1, 4] * float(self.available(symbol))) + float(self.available('EUR'))
 
     def training_worth(self, symbol):
-        return float(self.current[-1, 4] * 0.5 * float(self.get_balance(symbol=symbol)[0]['available'])) + float(self.get_balance(symbol='EUR')[0]['available'])
+        return float(self.current[-1, 4] * 0.5 * float(self.available(symbol))) + float(self.available('EUR'))
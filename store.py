@@ -0,0 +1,74 @@
+import os
+import struct
+import pickle
+import numpy as np
+
+
+# header: magic, version, columns, rows, padded to HEADER bytes
+# body: rows x columns little endian float64, the same layout the data arrays have in memory
+MAGIC = b'WLCS'
+VERSION = 1
+HEADER = 64
+HEADER_FORMAT = '<4sIIQ'
+
+
+class CandleStore:
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def header(self):
+        with open(self.path, 'rb') as fh:
+            magic, version, columns, rows = struct.unpack(HEADER_FORMAT, fh.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC: raise ValueError(f'{self.path} is not a candle store')
+        if version != VERSION: raise ValueError(f'{self.path} has unsupported version {version}')
+        return columns, rows
+
+    def read(self):
+        # zero-copy view on the file, nothing is loaded until it is touched
+        columns, rows = self.header()
+        if not rows: return np.empty((0, columns))
+        return np.asarray(np.memmap(self.path, dtype='<f8', mode='r', offset=HEADER, shape=(rows, columns)))
+
+    def last(self):
+        # last stored timestamp, None when empty
+        columns, rows = self.header()
+        if not rows: return None
+        with open(self.path, 'rb') as fh:
+            fh.seek(HEADER + (rows - 1) * columns * 8)
+            return float(np.frombuffer(fh.read(8), dtype='<f8')[0])
+
+    def write(self, data):
+        # full rewrite, into a temp file that replaces the store
+        data = np.ascontiguousarray(data, dtype='<f8')
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, data.shape[1], data.shape[0]).ljust(HEADER, b'\0'))
+            fh.write(data.tobytes())
+        os.replace(tmp, self.path)
+
+    def append(self, data):
+        # new rows go after the last counted row, the row count is only bumped once they are written
+        data = np.ascontiguousarray(data, dtype='<f8')
+        if not self.exists(): return self.write(data)
+        columns, rows = self.header()
+        if data.shape[1] != columns: raise ValueError(f'{self.path} has {columns} columns, got {data.shape[1]}')
+
+        with open(self.path, 'r+b') as fh:
+            fh.seek(HEADER + rows * columns * 8)
+            fh.write(data.tobytes())
+            fh.truncate()
+            fh.flush()
+            fh.seek(0)
+            fh.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, columns, rows + len(data)))
+
+
+def migrate(dat_path: str, path: str):
+    # pickled array from before the store
+    with open(dat_path, 'rb') as fh:
+        data = pickle.load(fh)
+    store = CandleStore(path)
+    store.write(data)
+    return store
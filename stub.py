@@ -0,0 +1,160 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real api
+    disable_nagle_algorithm = True # headers and body go out in separate writes, do not hold the body back
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: value[0] for key, value in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+
+        exchange = self.server.exchange
+        status = exchange.failure(self.path)
+        if status: return self.reply(status, {'errorCode': 105 if status == 429 else 101, 'error': 'Injected failure.'})
+        if len(parts) == 3 and parts[2] == 'candles':
+            return self.reply(200, exchange.candles(parts[1], query))
+        if parts[1:] == ['balance']:
+            return self.reply(200, exchange.get_balance(query.get('symbol', '')))
+        if parts[1:] == ['trades']:
+            return self.reply(200, exchange.get_trades(query.get('market', '')))
+        if parts[1:] == ['time']:
+            return self.reply(200, {'time': int(time.time() * 1000)})
+
+        self.reply(404, {'errorCode': 110, 'error': 'Invalid endpoint.'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if urlparse(self.path).path.strip('/').split('/')[1:] == ['order']:
+            if body.get('side') == 'buy' and 'amountQuote' not in body or body.get('side') == 'sell' and 'amount' not in body:
+                return self.reply(400, {'errorCode': 203, 'error': 'amount or amountQuote parameter is required.'})
+            return self.reply(200, self.server.exchange.place_order(body))
+
+        self.reply(404, {'errorCode': 110, 'error': 'Invalid endpoint.'})
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        exchange = self.server.exchange
+        with exchange.lock:
+            exchange.requests.append(self.path)
+            # one weight per request, the budget resets `window` seconds after it was first used
+            now = time.time()
+            if now >= exchange.reset_at:
+                exchange.ratelimit, exchange.reset_at = exchange.limit, now + exchange.window
+            exchange.ratelimit -= 1
+            remaining, reset_at = exchange.ratelimit, exchange.reset_at
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('bitvavo-ratelimit-limit', str(exchange.limit))
+        self.send_header('bitvavo-ratelimit-remaining', str(remaining))
+        self.send_header('bitvavo-ratelimit-resetat', str(int(reset_at * 1000)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubExchange:
+    # local stand-in for the Bitvavo api, serves candles from arrays (timestamp, open, high, low, close, volume)
+    # and fills market orders at the last visible close, with the same 0.25% fee as TestClient
+    # with StubExchange({'ETH-EUR': data}) as exchange: RestClient('', '', base=exchange.base)
+    def __init__(self, markets: dict, port: int = 0, limit: int = 1000, window: float = 60.0, balance: dict | None = None):
+        self.markets = {market: data[data[:, 0].argsort()] for market, data in markets.items()}
+        self.now = float('inf') # candles after this timestamp are not served yet
+        self.balance = dict(balance or {})
+        self.trades = []
+        self.limit = limit
+        self.window = window
+        self.ratelimit = limit
+        self.reset_at = 0.0
+        self.requests = []
+        self.failures = [] # (path substring, status), the first request matching one fails with it
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+        self.server.exchange = self
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}/v2'
+        self.thread = None
+
+    def fail(self, match: str, status: int = 500):
+        # the next GET whose path contains `match` gets `status` instead of an answer
+        with self.lock:
+            self.failures.append((match, status))
+
+    def failure(self, path):
+        with self.lock:
+            for n, (match, status) in enumerate(self.failures):
+                if match in path:
+                    del self.failures[n]
+                    return status
+        return None
+
+    def candles(self, market, query):
+        # newest first, `start`/`end` inclusive, at most `limit`
+        data = self.markets.get(market, np.empty((0, 6)))
+        data = data[data[:, 0] <= self.now]
+        if 'start' in query: data = data[data[:, 0] >= int(query['start'])]
+        if 'end' in query: data = data[data[:, 0] <= int(query['end'])]
+        data = data[::-1][:int(query.get('limit', 1440))]
+        return [[int(row[0])] + [str(value) for value in row[1:]] for row in data]
+
+    def get_balance(self, symbol):
+        with self.lock:
+            balance = [{'symbol': s, 'available': str(amount), 'inOrder': '0'} for s, amount in self.balance.items()]
+        return [b for b in balance if b['symbol'] == symbol] if symbol else balance
+
+    def get_trades(self, market):
+        with self.lock:
+            return [trade for trade in self.trades if not market or trade['market'] == market]
+
+    def place_order(self, body):
+        market = body['market']
+        symbol, quote = market.split('-')
+        data = self.markets[market]
+        price = float(data[data[:, 0] <= self.now][-1, 4])
+
+        with self.lock:
+            if body['side'] == 'buy':
+                amount_quote = float(body['amountQuote'])
+                fee = amount_quote * 0.0025
+                amount = (amount_quote - fee) / price
+                self.balance[quote] = self.balance.get(quote, 0) - amount_quote
+                self.balance[symbol] = self.balance.get(symbol, 0) + amount
+            else:
+                amount = float(body['amount'])
+                fee = amount * price * 0.0025
+                self.balance[symbol] = self.balance.get(symbol, 0) - amount
+                self.balance[quote] = self.balance.get(quote, 0) + amount * price - fee
+
+            trade = {
+                'timestamp': int(min(self.now, data[-1, 0])),
+                'market': market,
+                'side': body['side'],
+                'amount': str(amount),
+                'price': str(price),
+                'fee': str(fee),
+            }
+            self.trades.insert(0, trade)
+        return trade
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,134 @@
+import os
+import pickle
+import random
+import numpy as np
+import algo
+import provider
+import weatherlight
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def window(size=500):
+    with open(os.path.join(ROOT, 'data/data-ETH-EUR-1d.dat'), 'rb') as fh:
+        data = pickle.load(fh)
+    data = weatherlight.algo_indicators(data[-size:])
+    return data, f'data[-1, (__number__ % {len(data[-1]) - 1})+1]'
+
+
+# the string gene decoder from before packed genes, kept as the reference
+def reference_to_function(gene: str, template: str = '__number__'):
+    f = 0.015748031496062992
+    function = ''
+    stoploss = 1.0
+    n = 0
+    while True:
+        if n >= len(gene) - 1: break
+
+        enabled = bool(int(gene[n:n + algo.ENABLER], 2))
+        n += algo.ENABLER
+
+        if not enabled:
+            n += (algo.GENE - algo.ENABLER)
+            continue
+
+        value_or_ref = bool(int(gene[n], 2))
+        left = str(int(gene[n + 1:n + algo.NUMBER], 2))
+        if value_or_ref: left = template.replace('__number__', left)
+        n += algo.NUMBER
+
+        enabled = bool(int(gene[n], 2))
+        left_factor = str((int(gene[n + 1:n + algo.NUMBER], 2) - 63.5) * f)
+        if enabled: left += f'*{left_factor}'
+        n += algo.NUMBER
+
+        operator = algo.OPERATOR_MAP[int(gene[n:n + algo.OPERATOR], 2)]
+        n += algo.OPERATOR
+
+        value_or_ref = bool(int(gene[n], 2))
+        right = str(int(gene[n + 1:n + algo.NUMBER], 2))
+        if value_or_ref: right = template.replace('__number__', right)
+        n += algo.NUMBER
+
+        enabled = bool(int(gene[n], 2))
+        right_factor = str((int(gene[n + 1:n + algo.NUMBER], 2) - 63.5) * f)
+        if enabled: right += f'*{right_factor}'
+        n += algo.NUMBER
+
+        function += f'(({left}){operator}({right})){algo.SEPARATOR_MAP[int(gene[n:n + algo.SEPARATOR], 2)]}'
+        n += algo.SEPARATOR
+
+        stoploss = 1.0 - ( int(gene[n:n + algo.STOPLOSS], 2) / 100 )
+        n += algo.STOPLOSS
+
+    function = function[:-1]
+    if not function: function = 'False'
+    return function, stoploss
+
+
+def string_genes(gene_size, number=20, seed=1):
+    generator = random.Random(seed)
+    return [''.join(generator.choice('01') for _ in range(algo.GENE * gene_size)) for _ in range(number)]
+
+
+def test_string_genes_round_trip():
+    # sizes where GENE * gene_size bits do and do not fill whole bytes
+    for gene_size in (1, 2, 3, 8, 32):
+        for gene in string_genes(gene_size) + ['0' * algo.GENE * gene_size, '1' * algo.GENE * gene_size]:
+            bits = algo.to_bits(gene)
+            assert bits.dtype == np.uint8 and len(bits) == -(-len(gene) // 8)
+            assert algo.to_string(bits) == gene
+
+
+def test_to_function_on_string_and_packed_genes():
+    template = 'data[-1, (__number__ % 10)+1]'
+    for gene_size in (1, 3, 8, 32):
+        for gene in string_genes(gene_size):
+            expected = reference_to_function(gene, template)
+            assert algo.to_function(gene, template) == expected
+            assert algo.to_function(algo.to_bits(gene), template) == expected
+
+
+def test_load_converts_string_genes(tmp_path):
+    # populations pickled before packed genes
+    nodes = [{'buy': buy, 'sell': sell, 'perf': float(n)} for n, (buy, sell) in enumerate(zip(string_genes(4), string_genes(4, seed=2)))]
+    path = str(tmp_path / 'gene-legacy.dat')
+    with open(path, 'wb') as fh:
+        pickle.dump(nodes, fh)
+
+    loaded = algo.load(path)
+    assert [algo.to_string(node['buy']) for node in loaded] == [node['buy'] for node in nodes]
+    assert [algo.to_string(node['sell']) for node in loaded] == [node['sell'] for node in nodes]
+    population = algo.Population.from_nodes(loaded)
+    assert [algo.to_string(gene) for gene in population.buy] == [node['buy'] for node in nodes]
+    assert population.perf.tolist() == [node['perf'] for node in nodes]
+
+
+def test_reseed_gives_independent_generators():
+    first, second = np.random.SeedSequence().spawn(2)
+    algo.reseed(first)
+    a = algo.new_genes(8, 32)
+    algo.reseed(second)
+    b = algo.new_genes(8, 32)
+    assert not np.array_equal(a, b)
+
+
+def test_islands_spawn_different_genes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('data')
+    open('lock', 'w').close()
+    data, template = window()
+
+    archipelago = algo.Archipelago(
+        api_class=provider.TestClient, markets=['ETH-EUR'], interval='1d', window_size=len(data),
+        population_size=16, gene_size=8, mutation_rate=0.02, islands=2,
+    )
+    try: archipelago.run(data, template)
+    finally: archipelago.close()
+
+    first, _ = algo.load_checkpoint(f'data/gene-ETH-EUR_1d_w{len(data)}_p16_g8_i0.npz')
+    second, _ = algo.load_checkpoint(f'data/gene-ETH-EUR_1d_w{len(data)}_p16_g8_i1.npz')
+    assert len(first) == len(second) == 16
+    assert not np.array_equal(first.buy, second.buy)
+    assert not np.array_equal(first.sell, second.sell)
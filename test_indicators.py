@@ -0,0 +1,154 @@
+import os
+import pickle
+import numpy as np
+import indicators
+import weatherlight
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# the block kernels sum with cumsum differences instead of one slice at a time, so values are not
+# bit-identical to the per-row loops: on the 6h window about 46% match exactly and the largest
+# difference is ~3e-10 (relative ~3e-12), on prices, volumes and rsi. nan positions have to match exactly
+RTOL = 1e-12
+ATOL = 1e-8
+
+
+# the per-row loops from before the block kernels, kept as the reference
+def reference_sma(data, period):
+    result = np.empty((len(data), 1,))
+    result[:] = np.nan
+
+    for n in range(len(data)):
+        if period > n: continue
+        result[n, 0] = data[n-period:n].sum() / period
+
+    return result
+
+
+def reference_sma_column(data, period, column=4):
+    return np.c_[data, reference_sma(data[:, column], period)]
+
+
+def reference_rsi_column(data, period, column=4):
+    result = np.empty((len(data), 1,))
+    result[:] = np.nan
+
+    diff_up = np.array([0.0] * len(data))
+    diff_down = np.array([0.0] * len(data))
+    for n in range(len(data)):
+        if n == 0: continue
+        diff = data[n, column] - data[n-1, column]
+        if diff > 0: diff_up[n] = abs(diff)
+        if 0 > diff: diff_down[n] = abs(diff)
+
+    for n in range(len(data)):
+        if period > n: continue
+        mean_up = diff_up[n-period:n].mean()
+        mean_down = diff_down[n-period:n].mean()
+
+        if mean_down == 0.0:
+            rs = mean_up
+        else:
+            rs = mean_up / mean_down
+
+        result[n] = 100 - (100 / (1 + rs))
+
+    return np.c_[data, result]
+
+
+def reference_trim(data):
+    while True and data.size:
+        if not np.isnan(data[0]).any(): break
+        data = np.delete(data, 0, axis=0)
+    return data
+
+
+def reference_algo_indicators(data, trim=True):
+    # ema() appended the sma column as well
+    n = data.shape[1]
+    for indicator in [reference_sma_column, reference_sma_column, reference_rsi_column]:
+        for period in [3, 5, 8, 13, 21, 34, 55, 89, 144]:
+            for c in range(1, n):
+                data = indicator(data, period, c)
+    return reference_trim(data) if trim else data
+
+
+def reference_apply_indicators(data, trim=True):
+    for func, period in [(reference_sma_column, 240), (reference_sma_column, 360), (reference_rsi_column, 24)]:
+        data = func(data, period)
+    return reference_trim(data) if trim else data
+
+
+def load(interval):
+    with open(os.path.join(ROOT, f'data/data-ETH-EUR-{interval}.dat'), 'rb') as fh:
+        return pickle.load(fh)
+
+
+def with_nans(data):
+    # a few missing values in the middle, in the close and in other columns
+    data = data.copy()
+    rows = len(data)
+    data[rows // 3, 4] = np.nan
+    data[rows // 2, 2] = np.nan
+    data[rows // 2 + 7, 5] = np.nan
+    return data
+
+
+def assert_parity(result, reference):
+    assert result.shape == reference.shape
+    assert np.array_equal(np.isnan(result), np.isnan(reference))
+    np.testing.assert_allclose(result, reference, rtol=RTOL, atol=ATOL, equal_nan=True)
+
+
+def test_algo_indicators():
+    data = load('6h')[-1440:]
+    assert_parity(weatherlight.algo_indicators(data), reference_algo_indicators(data))
+
+
+def test_algo_indicators_warm_up_rows():
+    # untrimmed, the warm-up rows are nan in the same places
+    data = load('6h')[-400:]
+    assert_parity(weatherlight.algo_features(data), reference_algo_indicators(data, trim=False))
+
+
+def test_algo_indicators_with_nans():
+    data = with_nans(load('6h')[-1440:])
+    assert_parity(weatherlight.algo_features(data), reference_algo_indicators(data, trim=False))
+    assert_parity(weatherlight.algo_indicators(data), reference_algo_indicators(data))
+
+
+def test_apply_indicators():
+    data = load('6h')[:, :6]
+    assert_parity(weatherlight.apply_indicators(data), reference_apply_indicators(data))
+
+
+def test_apply_indicators_with_nans():
+    data = with_nans(load('1d')[:, :6])
+    assert_parity(weatherlight.apply_indicators(data), reference_apply_indicators(data))
+
+
+def test_rsi_last_matches_rsi_block():
+    data = with_nans(load('6h'))
+    for start in (0, 1500, len(data) // 2 - 100):
+        block = data[start:start + 145, 1:]
+        expected = [indicators.rsi_block(block[:, c], [144])[-1, 0] for c in range(block.shape[1])]
+        assert np.array_equal(indicators.rsi_last(block, 144), expected, equal_nan=True)
+
+
+def stream(data):
+    # the live indicators fed one candle at a time
+    live = indicators.Stream(weatherlight.LIVE_INDICATORS)
+    return indicators.trim(np.array([live.update(candle) for candle in data]))
+
+
+def test_stream_matches_apply_indicators():
+    for interval in ('6h', '1d'):
+        data = load(interval)[:, :6]
+        assert_parity(stream(data), weatherlight.apply_indicators(data))
+
+
+def test_stream_matches_apply_indicators_with_nans():
+    for interval in ('6h', '1d'):
+        data = with_nans(load(interval)[:, :6])
+        assert_parity(stream(data), weatherlight.apply_indicators(data))
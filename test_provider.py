@@ -0,0 +1,165 @@
+import os
+import pickle
+import threading
+import pytest
+import requests
+from datetime import datetime, timezone
+import numpy as np
+import provider
+import stub
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def exchange():
+    with open(os.path.join(ROOT, 'data/data-ETH-EUR-6h.dat'), 'rb') as fh:
+        data = pickle.load(fh)[:, :6]
+    with stub.StubExchange({'ETH-EUR': data}) as exchange:
+        exchange.data = data
+        yield exchange
+
+
+def client(exchange):
+    return provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter(), verbose=False)
+
+
+def test_full_history(exchange):
+    data = client(exchange).get_market('ETH-EUR', '6h', 1440, -1)
+    assert np.array_equal(data, exchange.data[:-1])
+
+
+def test_failed_page_raises_instead_of_truncating(exchange):
+    # a rate limited page in the middle of the history is not the end of it
+    exchange.fail('&start=', 429)
+    with pytest.raises(requests.HTTPError):
+        client(exchange).get_market('ETH-EUR', '6h', 1440, -1)
+
+
+def test_failed_first_page_raises(exchange):
+    exchange.fail('/candles', 500)
+    with pytest.raises(requests.HTTPError):
+        client(exchange).get_market('ETH-EUR', '6h', 1440, 1)
+
+
+def test_failed_page_since_raises(exchange):
+    # sync() resumes after the last stored candle, a gap would never be filled
+    since = exchange.data[-3000, 0]
+    exchange.fail('&start=', 500)
+    with pytest.raises(requests.HTTPError):
+        client(exchange).get_market('ETH-EUR', '6h', 1440, since=since, now=exchange.data[-1, 0])
+    data = client(exchange).get_market('ETH-EUR', '6h', 1440, since=since, now=exchange.data[-1, 0])
+    assert np.array_equal(data, exchange.data[-2999:-1])
+
+
+def test_failed_request_is_counted(exchange):
+    api = client(exchange)
+    exchange.fail('/candles', 429)
+    with pytest.raises(requests.HTTPError):
+        api.get_market('ETH-EUR', '6h', 1440, 1)
+    assert api.metrics.snapshot()['GET /{market}/candles']['errors'] == {'429': 1}
+
+
+def ms(*date):
+    return int(datetime(*date, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def months(first, count):
+    # candles opened on the first of `count` months from `first` (year, month)
+    year, month = first
+    opened = [ms(year + (month - 1 + n) // 12, (month - 1 + n) % 12 + 1, 1) for n in range(count)]
+    return np.c_[opened, np.ones((count, 4)) * 100, np.ones(count)].astype(float)
+
+
+def test_candle_close_months():
+    opened = [ms(2021, 1, 1), ms(2021, 2, 1), ms(2024, 2, 1), ms(2021, 4, 1), ms(2021, 12, 1)]
+    closes = [ms(2021, 2, 1), ms(2021, 3, 1), ms(2024, 3, 1), ms(2021, 5, 1), ms(2022, 1, 1)]
+    assert provider.candle_close(opened, '1M').tolist() == closes
+    assert [provider.next_close(t + 1, '1M') for t in opened] == closes
+    assert provider.candle_close(ms(2021, 2, 1), '1d') == ms(2021, 2, 2)
+
+
+def test_short_month_is_closed_at_its_end():
+    # february 2021 has 28 days, its candle is closed on march 1st
+    data = months((2020, 1), 15)
+    with stub.StubExchange({'ETH-EUR': data}) as exchange:
+        result = client(exchange).get_market('ETH-EUR', '1M', 1440, since=ms(2020, 12, 1), now=ms(2021, 3, 1))
+    assert result[:, 0].tolist() == [ms(2021, 1, 1), ms(2021, 2, 1)]
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def limiter(limit=10, reserve=3):
+    return provider.RateLimiter(limit=limit, reserve=reserve, window=60.0, clock=FakeClock())
+
+
+def start_acquire(limiter, weight=1, priority=False):
+    # acquire on its own thread, the waited seconds end up in `result`
+    result = []
+    thread = threading.Thread(target=lambda: result.append(limiter.acquire(weight, priority)), daemon=True)
+    thread.start()
+    thread.join(0.1)
+    return thread, result
+
+
+def release(limiter, thread):
+    with limiter.condition: limiter.condition.notify_all()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_bulk_acquire_leaves_the_reserve_for_orders():
+    bucket = limiter()
+    assert bucket.acquire(7) == 0.0
+    thread, result = start_acquire(bucket)
+    assert thread.is_alive() and bucket.remaining == 3
+
+    # orders can spend the reserve, bulk stays blocked
+    order, waited = start_acquire(bucket, 2, priority=True)
+    assert not order.is_alive() and waited == [0.0]
+    assert bucket.remaining == 1
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    # a new window lets it through, after waiting for it on the clock
+    bucket.clock.now = 61.0
+    release(bucket, thread)
+    assert result == [61.0] and bucket.remaining == 9
+
+
+def test_bulk_acquire_yields_to_waiting_orders():
+    bucket = limiter()
+    bucket.orders_waiting = 1
+    thread, result = start_acquire(bucket)
+    assert thread.is_alive() and bucket.remaining == 10
+
+    with bucket.condition: bucket.orders_waiting = 0
+    release(bucket, thread)
+    assert result == [0.0] and bucket.remaining == 9
+
+
+def test_update_from_the_exchange():
+    bucket = limiter(limit=1000, reserve=100)
+    bucket.acquire(1)
+    assert bucket.reset_at == 60.0
+
+    # a new exchange window replaces the local budget, up or down
+    assert bucket.update({'bitvavo-ratelimit-remaining': '500', 'bitvavo-ratelimit-resetat': '30000'}) == 500
+    assert bucket.reset_at == 30.0
+
+    # the same window can only lower it
+    assert bucket.update({'bitvavo-ratelimit-remaining': '700', 'bitvavo-ratelimit-resetat': '30000'}) == 500
+    assert bucket.update({'bitvavo-ratelimit-remaining': '400', 'bitvavo-ratelimit-resetat': '30000'}) == 400
+
+    assert bucket.update({'bitvavo-ratelimit-remaining': '990', 'bitvavo-ratelimit-resetat': '90000'}) == 990
+    assert bucket.reset_at == 90.0
+
+    # an answer from the old window arriving late is ignored
+    assert bucket.update({'bitvavo-ratelimit-remaining': '10', 'bitvavo-ratelimit-resetat': '30000'}) == 990
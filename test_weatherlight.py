@@ -0,0 +1,190 @@
+import os
+import pickle
+import json
+import asyncio
+import numpy as np
+import metrics
+import provider
+import stub
+import weatherlight
+import test_provider
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load():
+    with open(os.path.join(ROOT, 'data/data-ETH-EUR-6h.dat'), 'rb') as fh:
+        return pickle.load(fh)[:, :6]
+
+
+def test_feature_store_windows():
+    # windows from the full history match computing them from scratch, up to the cumsum rounding
+    with open(os.path.join(ROOT, 'data/data-ETH-EUR-6h.dat'), 'rb') as fh:
+        data = pickle.load(fh)
+    features = weatherlight.FeatureStore(data)
+    for start in (0, 1, 500, len(data) - 1440, len(data) - 150):
+        window = features.window(start, start + 1440)
+        expected = weatherlight.algo_indicators(data[start:start + 1440])
+        assert window.shape == expected.shape
+        assert np.array_equal(np.isnan(window), np.isnan(expected))
+        np.testing.assert_allclose(window, expected, rtol=1e-12, atol=1e-8)
+
+
+def test_feature_store_windows_do_not_change():
+    data = load()
+    features = weatherlight.FeatureStore(data)
+    window = features.window(0, 1440)
+    before = window.copy()
+    features.window(1, 1441)
+    features.window(0, 1440)
+    assert np.array_equal(window, before)
+
+
+def replay(exchange, api, markets, start, stop, delay=2.5, interval='6h', recorder=metrics.disabled):
+    # live_markets on simulated time, from timestamp `start` until `stop` (ms)
+    # the clock only moves once every market is asleep, candles show up `delay` seconds after their close
+    clock = provider.SimClock(start / 1000 + 100)
+    exchange.now = clock.now * 1000
+
+    async def main():
+        task = asyncio.ensure_future(weatherlight.live_markets(markets, interval, api, clock, recorder=recorder))
+        while clock.now < stop / 1000:
+            await asyncio.sleep(0.005)
+            if task.done(): return task.result()
+            if len(clock.sleepers) < len(markets): continue
+            clock.step()
+            exchange.now = clock.now * 1000 - delay * 1000
+        task.cancel()
+
+    asyncio.run(main())
+
+
+def test_live_markets_run_independently(capsys):
+    # XRP-EUR has no candles when the runner starts and gets them halfway,
+    # ETH-EUR decides on every candle regardless
+    data = load()
+    start, stop, late = data[3000, 0], data[3012, 0], data[3006, 0]
+    xrp = data[data[:, 0] >= late]
+
+    with stub.StubExchange({'ETH-EUR': data, 'XRP-EUR': xrp}, balance={'EUR': 1000.0}) as exchange:
+        api = provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter(), verbose=False)
+        replay(exchange, api, ['ETH-EUR', 'XRP-EUR'], start, stop)
+
+    lines = capsys.readouterr().out.splitlines()
+    eth = [line for line in lines if line.startswith('ETH-EUR 2')]
+    xrp = [line for line in lines if line.startswith('XRP-EUR 2')]
+    assert len(eth) >= 10
+    assert any('XRP-EUR no candles' in line for line in lines)
+    assert xrp and all(line.split(' ', 1)[1] >= provider.to_date(late) for line in xrp)
+    assert not [line for line in lines if line.startswith('[ERROR]') and 'no candles' not in line]
+
+
+def test_live_market_without_candles_keeps_others_running(capsys):
+    data = load()
+    with stub.StubExchange({'ETH-EUR': data}, balance={'EUR': 1000.0}) as exchange:
+        api = provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter(), verbose=False)
+        replay(exchange, api, ['ETH-EUR', 'XRP-EUR'], data[3000, 0], data[3004, 0])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len([line for line in lines if line.startswith('ETH-EUR 2')]) >= 3
+    assert not [line for line in lines if line.startswith('XRP-EUR 2')]
+
+
+def test_failed_candle_fetch_is_retried(capsys):
+    # a rate limited fetch after the close is tried again, the candle is not skipped
+    data = load()
+    with stub.StubExchange({'ETH-EUR': data}, balance={'EUR': 1000.0}) as exchange:
+        exchange.fail('&start=', 429)
+        api = provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter(), verbose=False)
+        replay(exchange, api, ['ETH-EUR'], data[3000, 0], data[3004, 0])
+
+    lines = capsys.readouterr().out.splitlines()
+    dates = [line.split(' ')[1] + ' ' + line.split(' ')[2] for line in lines if line.startswith('ETH-EUR 2')]
+    assert any(line.startswith('[ERROR] ETH-EUR') and '429' in line for line in lines)
+    assert len(dates) >= 3
+    assert dates == [provider.to_date(timestamp) for timestamp in data[3000:3000 + len(dates), 0]]
+
+
+def test_month_candles_are_decided_at_their_close(capsys):
+    # 28, 30 and 31 day months are all picked up right after they close
+    data = test_provider.months((2019, 1), 30)
+    with stub.StubExchange({'ETH-EUR': data}, balance={'EUR': 1000.0}) as exchange:
+        api = provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter(), verbose=False)
+        replay(exchange, api, ['ETH-EUR'], data[24, 0], data[29, 0], interval='1M')
+
+    lines = capsys.readouterr().out.splitlines()
+    decided = [line for line in lines if line.startswith('ETH-EUR 2')]
+    assert [line.split(' ', 1)[1][:19] for line in decided] == [provider.to_date(timestamp) for timestamp in data[24:28, 0]]
+    assert all(line.endswith('+1.00s') for line in decided)
+
+
+def test_request_metrics_per_market(tmp_path):
+    # every market's lines count its own requests only, though the markets share one client
+    data = load()
+    path = str(tmp_path / 'metrics.jsonl')
+    recorder = metrics.Metrics(path)
+    with stub.StubExchange({'ETH-EUR': data, 'BTC-EUR': data}, balance={'EUR': 1000.0}) as exchange:
+        api = provider.RestClient('', '', base=exchange.base, limiter=provider.RateLimiter(), verbose=False)
+        replay(exchange, api, ['ETH-EUR', 'BTC-EUR'], data[3000, 0], data[3006, 0], recorder=recorder)
+        served = {market: sum(f'/{market}/candles' in path for path in exchange.requests) for market in ('ETH-EUR', 'BTC-EUR')}
+    recorder.close()
+
+    with open(path) as fh:
+        lines = [json.loads(line) for line in fh]
+    for market in ('ETH-EUR', 'BTC-EUR'):
+        own = [line for line in lines if line['market'] == market]
+        assert len(own) >= 4
+        for line in own:
+            # one account snapshot per decision
+            assert line['endpoints']['GET /balance']['requests'] == 1
+            assert line['endpoints']['GET /trades']['requests'] == 1
+        # the seed and one fetch per close, the fetches after the last export are not in any line
+        candles = sum(line['endpoints']['GET /{market}/candles']['requests'] for line in own)
+        assert len(own) + 1 <= candles <= served[market]
+
+
+def random_walk(seed, rows, last_trade=False):
+    # hourly candles of a seeded random walk with the live indicators applied
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01 * rng.uniform(0.5, 3), rows)))
+    data = weatherlight.apply_indicators(np.c_[np.arange(rows) * 3600000.0, close, close * 1.01, close * 0.99, close, np.ones(rows)])
+    if last_trade:
+        # buy conditions on the last candle: rsi above 70 and the close above the long average
+        data[-1, 8] = 80
+        data[-1, 4] = data[-1, 7] + 1
+    return data
+
+
+def step_loop(data, wallet_start=1000):
+    # strategy() candle by candle on TestClient, like test() --step
+    api = provider.TestClient()
+    api.set_data(data)
+    api.set_balance(balance={'EUR': wallet_start})
+    trades, worths = [], []
+    counter, step = -1, True
+    while step:
+        counter, step = api.step(counter, 1)
+        buy, sell = weatherlight.strategy(api, 'ETH-EUR', '1h', True)
+        quo, sym = float(api.available('EUR')), float(api.available('ETH'))
+        if buy: api.place_order(market='ETH-EUR', side='buy', order_type='market', amountQuote=quo)
+        if sell: api.place_order(market='ETH-EUR', side='sell', order_type='market', amount=sym)
+        worths.append(api.net_worth('ETH'))
+        if buy or sell: trades.append((counter, 'buy' if buy else 'sell', quo, sym, worths[-1]))
+    return trades, worths
+
+
+def test_backtest_matches_step_loop():
+    last_trades = 0
+    for seed, rows, last_trade in [(1, 800, False), (2, 1500, True), (3, 2500, False), (4, 1200, True), (5, 3000, False)]:
+        data = random_walk(seed, rows, last_trade)
+        expected, worths = step_loop(data)
+        trades, quo, sym = weatherlight.backtest(data, *weatherlight.strategy_columns(data), 1000)
+
+        assert expected
+        assert [(int(row), *rest) for row, *rest in trades] == [(int(row), *rest) for row, *rest in expected]
+        assert float(data[-1, 4] * sym) + quo == worths[-1]
+        # the step loop acts on the last candle twice, the equity curve has one value per candle
+        assert np.array_equal(weatherlight.backtest_equity(data, trades, 1000), worths[:len(data)])
+        last_trades += trades[-1][0] == len(data) - 1
+    assert last_trades
@@ -3,100 +3,240 @@ import os
 import pickle
 import re
 import json
+import asyncio
+import requests
 from copy import deepcopy
-from time import sleep
 import numpy as np
 import indicators
 import provider
 import algo
+import store
+import metrics
+import journal
 
 
 settings = {'key':'', 'secret':''}
 for arg in sys.argv:
-    if not '.json' in arg: continue
+    if not '.json' in arg or arg.startswith('--'): continue
     with open(arg, 'r') as fh:
         settings = json.load(fh)
 
 
+def candles(market, interval):
+    candle_store = store.CandleStore(f'data/data-{market}-{interval}.bin')
+    if not candle_store.exists():
+        # pickled data from before the store
+        data_fn = f'data/data-{market}-{interval}.dat'
+        if os.path.exists(data_fn): store.migrate(data_fn, candle_store.path)
+    return candle_store
+
+
 def load(market, interval):
-    data_fn = f'data/data-{market}-{interval}.dat'
+    candle_store = candles(market, interval)
     data = []
-    if os.path.exists(data_fn):
-        with open(data_fn, 'rb') as fh:
-            data = pickle.load(fh)
+    if candle_store.exists():
+        data = candle_store.read()
     return data
 
 
 def save(data, market, interval):
-    with open(f'data/data-{market}-{interval}.dat', 'wb') as fh:
-        pickle.dump(data, fh)
+    candles(market, interval).write(data)
 
 
-def algo_indicators(data):
-    n = data.shape[1]
-    for indicator in [indicators.ema, indicators.sma, indicators.rsi]:
-        for period in [3, 5, 8, 13, 21, 34, 55, 89, 144]:
-            for c in range(1, n):
-                data = indicator(data, period, c)
-    
-    while True and data.size:
-        if not np.isnan(data[0]).any(): break
-        data = np.delete(data, 0, axis=0)
-    
+def sync(markets, interval):
+    # fetch what is missing after the last stored candle, or the whole history for a new store
+    candle_store = candles(markets[0], interval)
+    api = provider.RestClient(api_key=settings['key'], api_secret=settings['secret'])
+    last = candle_store.last() if candle_store.exists() else None
+    if last is None:
+        candle_store.write(api.get_data(markets=markets, interval=interval, number=-1))
+    else:
+        candle_store.append(api.get_data(markets=markets, interval=interval, since=last))
+    return candle_store.read()
+
+
+def prepare(markets, interval):
+    # saved data, refreshed with --sync
+    data = load(markets[0], interval)
+    if not len(data) or '--sync' in sys.argv:
+        data = sync(markets, interval)
     return data
 
 
+ALGO_INDICATORS = [indicators.ema_block, indicators.sma_block, indicators.rsi_block]
+ALGO_PERIODS = [3, 5, 8, 13, 21, 34, 55, 89, 144]
+
+
+def algo_features(data):
+    # same column order as applying ema, sma and rsi per period per column, without trimming
+    rows, n = data.shape
+    width = len(ALGO_PERIODS) * (n - 1)
+    result = np.empty((rows, n + len(ALGO_INDICATORS) * width))
+    result[:, :n] = data
+
+    for i, block in enumerate(ALGO_INDICATORS):
+        start = n + i * width
+        view = result[:, start:start + width].reshape(rows, len(ALGO_PERIODS), n - 1)
+        for c in range(1, n):
+            view[:, :, c - 1] = block(data[:, c], ALGO_PERIODS)
+
+    return result
+
+
+def algo_indicators(data):
+    return indicators.trim(algo_features(data))
+
+
+class FeatureStore:
+    # algo_features over the whole history, windows are served from it
+    def __init__(self, data):
+        self.data = data
+        self.features = algo_features(data)
+        self.warmup = max(ALGO_PERIODS)
+
+        # the rsi of the longest period per source column, the only values the first row of a window can differ in
+        n = data.shape[1]
+        width = len(ALGO_PERIODS) * (n - 1)
+        rsi = n + ALGO_INDICATORS.index(indicators.rsi_block) * width
+        self.rsi_columns = rsi + ALGO_PERIODS.index(self.warmup) * (n - 1) + np.arange(n - 1)
+
+        # first complete row at or after every row
+        rows = len(self.features)
+        complete = ~np.isnan(self.features).any(axis=1)
+        index = np.where(complete, np.arange(rows), rows)
+        self.complete = np.minimum.accumulate(index[::-1])[::-1]
+
+    def window(self, start, stop):
+        # same rows and values as algo_indicators(data[start:stop])
+        first = start + self.warmup
+        if first >= min(stop, len(self.features)):
+            return self.features[len(self.features):]
+        first = self.complete[first]
+        if first != start + self.warmup:
+            return self.features[first:stop]
+
+        # inside the window the first rsi difference is zero, so when the first row is exactly the warm-up row
+        # its longest rsi misses the difference before the window: recompute those values in a row of its own
+        row = self.features[first].copy()
+        row[self.rsi_columns] = indicators.rsi_last(self.data[start:first + 1, 1:], self.warmup)
+        return np.concatenate([row[None], self.features[first + 1:stop]])
+
+
+LIVE_INDICATORS = [
+    (indicators.ema, 240),
+    (indicators.ema, 360),
+    (indicators.rsi, 24),
+]
+
+
 def apply_indicators(data):    
     # timestamp     open    high    low     close   volume
     # 0             1       2       3       4       5
-    indicator_list = [
-        (indicators.ema, 240),
-        (indicators.ema, 360),
-        (indicators.rsi, 24),
-    ]
-
-    for indicator in indicator_list:
+    for indicator in LIVE_INDICATORS:
         func = indicator[0]
         args = indicator[1:]
         data = func(data, *args)
     
-    while True and data.size:
-        if not np.isnan(data[0]).any(): break
-        data = np.delete(data, 0, axis=0)
-
-    return data
-
-
-def strategy(api: provider.RestClient, market: str, interval: str, indicators: bool): # tuned for 1h
+    return indicators.trim(data)
+
+
+def strategy_columns(data):
+    # the conditions of strategy() over whole columns, without the position
+    # with the take-profit and stoploss factors on the last buy price
+    buy = \
+        (data[:, 8] > 70.0) & \
+        (data[:, 4] > data[:, 7])
+
+    sell = \
+        (30 > data[:, 8]) & \
+        (data[:, 6] > data[:, 4])
+
+    return buy, sell, 1.0025, 0.95
+
+
+def backtest(data, buy, sell, take_profit, stoploss, wallet_start, fee=0.0025):
+    # strategy() on TestClient in one pass: buy with all quote when flat, sell everything on a sell condition
+    # above the take-profit or below the stoploss, same fees and the same float operations as TestClient
+    # like the stepping loop, the last candle is acted on twice
+    rows = np.r_[np.arange(len(data)), len(data) - 1]
+    close, buy, sell = data[rows, 4], buy[rows], sell[rows]
+    entries = np.flatnonzero(buy)
+
+    quo, sym, history = float(wallet_start), 0.0, 0.0
+    trades = [] # (row, side, quo, sym before the order, net worth after it)
+    n = 0
+    while n < len(rows):
+        # a buy needs sym == 0 and a sell sym != 0, so both never fire on one candle
+        if sym == 0:
+            if not quo > 10: break
+            k = np.searchsorted(entries, n)
+            if k == len(entries): break
+            n = entries[k]
+            price = close[n]
+            amount = (quo - quo * fee) / price
+            order = (rows[n], 'buy', quo, sym)
+            quo, sym, history = quo - quo, sym + amount, price
+        else:
+            # first exit from n on, in growing chunks
+            chunk, start = 64, n
+            while start < len(rows):
+                window = close[start:start + chunk]
+                hit = sell[start:start + chunk] & (window > history * take_profit) | (history * stoploss > window)
+                if hit.any(): break
+                start, chunk = start + chunk, chunk * 2
+            else:
+                break
+            n = start + hit.argmax()
+            price = close[n]
+            amount_quote = sym * price
+            amount_quote -= amount_quote * fee
+            order = (rows[n], 'sell', quo, sym)
+            quo, sym = quo + amount_quote, sym - sym
+        trades.append(order + (float(price * sym) + quo,))
+        n += 1
+
+    return trades, quo, sym
+
+
+def backtest_equity(data, trades, wallet_start):
+    # net worth on every candle of a backtest(): the holdings after the last trade at or before it
+    # a buy leaves everything in the symbol, a sell everything in quote
+    rows = np.array([trade[0] for trade in trades], dtype=int)
+    sides = np.array([trade[1] == 'buy' for trade in trades], dtype=bool)
+    worths = np.array([trade[4] for trade in trades], dtype=float)
+    close = data[:, 4]
+    quo = np.where(sides, 0.0, worths)
+    sym = np.where(sides, worths / close[rows] if len(rows) else worths, 0.0)
+
+    last = np.searchsorted(rows, np.arange(len(data)), side='right') - 1
+    held_quo = np.where(last >= 0, quo[last.clip(0)] if len(rows) else 0.0, float(wallet_start))
+    held_sym = np.where(last >= 0, sym[last.clip(0)] if len(rows) else 0.0, 0.0)
+    return held_sym * close + held_quo
+
+
+def strategy(api: provider.RestClient, market: str, interval: str, indicators: bool, data=None, account=None): # tuned for 1h
     # indicators: tell strat if it still needs to apply indicators itself, or not
     # since the strat grabs data from api itself and the test environment has preloaded indicators for performance reasons, and live data has not
+    # data: rows with indicators already applied (live keeps them up to date with indicators.Stream)
+    # account: (quo, sym, last buy price) from api.account(), fetched here when not given
 
     symbol, quote = market.split('-')
-    data = api.get_data(market, interval, 1440, 1)
-    if not indicators: data = apply_indicators(data)
-    try: quo = float(api.get_balance(quote)[0]['available'])
-    except: quo = 0.0
-    try: sym = float(api.get_balance(symbol)[0]['available'])
-    except: sym = 0.0
-
-    for trade in api.get_trades(market):
-        if trade.get('side', '') != 'buy': continue
-        history = float(trade.get('price', 0.0))
-        break
-    else:
-        history = 0.0
+    if data is None:
+        data = api.get_data(market, interval, 1440, 1)
+        if not indicators: data = apply_indicators(data)
+    quo, sym, history = account or api.account(market)
+
+    buy, sell, take_profit, stoploss = strategy_columns(data[-1:])
 
     buy_signal = \
         (sym == 0) & (quo > 10) & \
-        (data[-1, 8] > 70.0) & \
-        (data[-1, 4] > data[-1, 7])
+        buy[0]
     
     sell_signal = \
         (sym != 0) & \
-        (30 > data[-1, 8]) & \
-        (data[-1, 4] > history * 1.0025) & \
-        (data[-1, 6] > data[-1, 4]) | \
-        (sym != 0) & (history * 0.95 > data[-1, 4]) # stoploss
+        sell[0] & \
+        (data[-1, 4] > history * take_profit) | \
+        (sym != 0) & (history * stoploss > data[-1, 4]) # stoploss
 
     if buy_signal and sell_signal:
         buy_signal, sell_signal = False, False
@@ -125,26 +265,42 @@ def incubator():
 
     markets, interval, population_size, gene_size, window_size = package1
 
+    # process pool for node evaluation, --workers=N
+    # or independent populations in their own processes, --islands=N, exchanging their best every --migrate=N generations
+    # per-stage timing and counters as json lines, --metrics=path
+    # trades go to logs/log.csv and the equity curve to logs/log-equity.bin, --quiet does not print the trades
+    workers = 0
+    islands = 0
+    migration_interval = 5
+    recorder = metrics.disabled
+    for arg in sys.argv:
+        if arg.startswith('--workers='): workers = int(arg.split('=')[1])
+        if arg.startswith('--islands='): islands = int(arg.split('=')[1])
+        if arg.startswith('--migrate='): migration_interval = int(arg.split('=')[1])
+        if arg.startswith('--metrics='): recorder = metrics.Metrics(arg.split('=')[1])
+    verbose = '--quiet' not in sys.argv
+    log = journal.Journal('logs/log', append=True)
+
     # prepare data, based on saved data, or refresh and save
     market = markets[0]
     symbol, quote = market.split('-')
-    data = load(market, interval)
-    if not len(data):
-        api = provider.RestClient(api_key=settings['key'], api_secret=settings['secret'])
-        data = api.get_data(markets=markets, interval=interval, number=-1)
-        save(data, market, interval)
+    data = prepare(markets, interval)
     
     # set up test environment
     api = provider.TestClient()
     api.set_balance(balance={'EUR': wallet_start})
     api.set_data(data=data)
+    features = FeatureStore(data)
     
     # set up incubator
     mutation_rate = 0.02
     incubation_period = 100
     reincubation_period = 20
 
-    incubator = algo.Incubator(api_class=provider.TestClient, markets=markets, interval=interval, window_size=window_size, population_size=population_size, gene_size=gene_size, mutation_rate=mutation_rate)
+    if islands:
+        incubator = algo.Archipelago(api_class=provider.TestClient, markets=markets, interval=interval, window_size=window_size, population_size=population_size, gene_size=gene_size, mutation_rate=mutation_rate, islands=islands, migration_interval=migration_interval, metrics=recorder.scope())
+    else:
+        incubator = algo.Incubator(api_class=provider.TestClient, markets=markets, interval=interval, window_size=window_size, population_size=population_size, gene_size=gene_size, mutation_rate=mutation_rate, workers=workers, metrics=recorder.scope())
     actor = None
 
     # step through test data
@@ -152,12 +308,13 @@ def incubator():
     while alive:
 
         # exit
-        with open('lock', 'r') as lock:
-            if lock.read(): sys.exit()
+        with recorder.stage('lock'):
+            with open('lock', 'r') as lock:
+                if lock.read(): sys.exit()
 
-        counter, alive = api.step(counter, window_size)
-        data = api.get_data()
-        data = algo_indicators(data)
+        with recorder.stage('features'):
+            counter, alive = api.step(counter, window_size)
+            data = features.window(counter, counter + window_size)
 
         # template
         row_length = len(data[-1]) - 1
@@ -168,24 +325,21 @@ def incubator():
             value_start = data[-1, 4]
         
         # strat
-        while incubation_period:
-            incubation_period -= 1
-            buy, sell, stoploss = incubator.run(data, template)
+        with recorder.stage('incubate'):
+            recorder.count('generations', incubation_period)
+            while incubation_period:
+                incubation_period -= 1
+                buy, sell, stoploss = incubator.run(data, template)
         incubation_period = reincubation_period # for next run
 
         print(f'\n    << {provider.to_date(data[-1, 0])} || {api.net_worth(symbol)} >>>\n')
         
         # get most recent interacted price
-        for trade in api.get_trades(market):
-            if trade.get('side', '') != 'buy': continue
-            history = trade.get('price', 0.0)
-            break
-        else:
-            history = 0.0
+        history = api.last_buy_price(market)
 
         # act
-        quo = float(api.get_balance(symbol=quote)[0]['available'])
-        sym = float(api.get_balance(symbol=symbol)[0]['available'])
+        quo = float(api.available(quote))
+        sym = float(api.available(symbol))
 
         buy_signal = eval(buy) & (sym == 0) & (quo > 10)
         sell_signal = (sym != 0) & (history * stoploss > data[-1, 4]) | (sym != 0) & eval(sell)
@@ -195,19 +349,19 @@ def incubator():
         
         if buy_signal:
             result = api.place_order(market=market, side='buy', order_type='market', amountQuote=quo)
-            msg = 'BUY  '
-            print(msg, end='')
-            with open('logs/log.txt', 'a') as log: log.write(msg)
         if sell_signal:
             result = api.place_order(market=market, side='sell', order_type='market', amount=sym)
-            msg = 'SELL '
-            print(msg, end='')
-            with open('logs/log.txt', 'a') as log: log.write(msg)
-        
+
+        worth = api.net_worth(symbol)
+        log.point(data[-1, 0], data[-1, 4], worth)
         if buy_signal or sell_signal:
-            msg = f'{provider.to_date(data[-1, 0]):19s}  EUR={quo:016.2f}  {symbol}={sym:016.4f}  WORTH={api.net_worth(symbol):16.4f}\n'
-            print(msg, end='')
-            with open('logs/log.txt', 'a') as log: log.write(msg)
+            log.trade(data[-1, 0], 'buy' if buy_signal else 'sell', data[-1, 4], quo, sym, worth)
+            if verbose: print(f'{"BUY  " if buy_signal else "SELL "}{provider.to_date(data[-1, 0]):19s}  EUR={quo:016.2f}  {symbol}={sym:016.4f}  WORTH={worth:16.4f}')
+
+        recorder.count('trades', int(buy_signal or sell_signal))
+        recorder.emit('step', date=provider.to_date(data[-1, 0]), step=counter, worth=worth)
+
+    log.close()
 
     # metrics
     value_end = data[-1, 4]
@@ -228,8 +382,9 @@ def incubator():
 
 
 def test():
-    with open('logs/out.csv', 'w') as fh:
-        fh.write('date,price,worth\n')
+    # trades go to logs/out.csv and the equity curve to logs/out-equity.bin, --quiet does not print the trades
+    log = journal.Journal('logs/out')
+    verbose = '--quiet' not in sys.argv
 
     # parameters
     market = 'ETH-EUR'
@@ -240,49 +395,59 @@ def test():
 
     # prepare data, based on saved data, or refresh and save
     symbol, quote = market.split('-')
-    data = load(market, interval)
-    if not len(data):
-        api = provider.RestClient(api_key=settings['key'], api_secret=settings['secret'])
-        data = api.get_data(market=market, interval=interval, number=-1)
-        save(data, market, interval)
+    data = prepare([market], interval)
     data = apply_indicators(data)
 
 
-    # set up test environment
-    api = provider.TestClient()
-    api.set_data(data)
-    api.set_balance(balance={'EUR': wallet_start})
+    # one pass over whole columns, --step runs strategy() candle by candle on TestClient
+    if '--step' not in sys.argv:
+        trades, quo_end, sym_end = backtest(data, *strategy_columns(data), wallet_start)
+        value_start = data[0, 4]
+        for row, side, quo, sym, worth in trades:
+            log.trade(data[row, 0], side, data[row, 4], quo, sym, worth)
+            if verbose: print(f'{"BUY " if side == "buy" else "SELL"} {provider.to_date(data[row, 0]):19s} {quo:16.2f} EUR  {sym:16.4f} {symbol}  {worth:16.4f} EUR worth')
+        log.curve(data[:, 0], data[:, 4], backtest_equity(data, trades, wallet_start))
+
+        api = provider.TestClient()
+        api.current = data[-1:]
+        api.set_balance(balance={quote: quo_end, symbol: sym_end})
+
+    else:
+        # set up test environment
+        api = provider.TestClient()
+        api.set_data(data)
+        api.set_balance(balance={'EUR': wallet_start})
     
-    h_month = 0
+        h_month = 0
 
-    # step through test data
-    step_counter, step = -1, True
-    while step:
-        step_counter, step = api.step(step_counter, 1)
-        data = api.get_data()
+        # step through test data
+        step_counter, step = -1, True
+        while step:
+            step_counter, step = api.step(step_counter, 1)
+            data = api.get_data()
 
-        # metrics
-        if not value_start:
-            value_start = data[-1, 4]
+            # metrics
+            if not value_start:
+                value_start = data[-1, 4]
         
-        # strategy
-        buy, sell = strategy(api, market, interval, True)
-
-        # act
-        quo = float(api.get_balance(symbol=quote)[0]['available'])
-        sym = float(api.get_balance(symbol=symbol)[0]['available'])
-        if buy:
-            result = api.place_order(market=market, side='buy', order_type='market', amountQuote=quo)
-        if sell:
-            result = api.place_order(market=market, side='sell', order_type='market', amount=sym)
+            # strategy
+            buy, sell = strategy(api, market, interval, True)
+
+            # act
+            quo = float(api.available(quote))
+            sym = float(api.available(symbol))
+            if buy:
+                result = api.place_order(market=market, side='buy', order_type='market', amountQuote=quo)
+            if sell:
+                result = api.place_order(market=market, side='sell', order_type='market', amount=sym)
         
-        if buy or sell:
-            if buy: print('BUY ', end=' ')
-            if sell: print('SELL', end=' ')
-            print(f'{provider.to_date(data[-1][0]):19s} {quo:16.2f} EUR  {sym:16.4f} {symbol}  {api.net_worth(symbol):16.4f} EUR worth')
+            worth = api.net_worth(symbol)
+            log.point(data[-1, 0], data[-1, 4], worth)
+            if buy or sell:
+                log.trade(data[-1, 0], 'buy' if buy else 'sell', data[-1, 4], quo, sym, worth)
+                if verbose: print(f'{"BUY " if buy else "SELL"} {provider.to_date(data[-1][0]):19s} {quo:16.2f} EUR  {sym:16.4f} {symbol}  {worth:16.4f} EUR worth')
 
-            with open('logs/out.csv', 'a') as fh:
-                fh.write(f'{provider.to_date(data[-1, 0])},{data[-1][4]},{api.net_worth(symbol)}\n')
+    log.close()
 
     # metrics
     value_end = data[-1, 4]
@@ -313,49 +478,114 @@ def status(market : str = 'ETH-EUR'):
     print(f'{trades=}')
 
 
-def live():
-    # parameters
-    market = 'ETH-EUR'
-    interval = '1h'
-
+def act(api: provider.RestClient, market: str, interval: str, row, recorder: metrics.Metrics = metrics.disabled):
+    # one decision on the latest row, with the indicators already applied
     symbol, quote = market.split('-')
+
+    # balances and last buy in one batch, used by the strategy and the order
+    with recorder.stage('account'):
+        account = api.account(market)
+    quo, sym, _ = account
+
+    # strategy
+    buy, sell = strategy(api, market, interval, True, row[None, :], account)
+
+    # act
+    with recorder.stage('order'):
+        if buy:
+            result = api.place_order(market=market, side='buy', order_type='market', amountQuote=quo)
+        if sell:
+            result = api.place_order(market=market, side='sell', order_type='market', amount=sym)
+
+    # report
+    if buy or sell:
+        if buy: print('BUY ', end=' ')
+        if sell: print('SELL', end=' ')
+        print(f'{market} {provider.to_date(row[0]):19s} {quo:16.2f} {quote}  {sym:16.4f} {symbol}')
+
+    return buy, sell
+
+
+async def live_market(api: provider.RestClient, market: str, interval: str, clock: provider.Clock | None = None, delay: float = 1.0, retry: float = 1.0, retries: int = 30, warmup: float = 5.0, recorder: metrics.Metrics = metrics.disabled):
+    # wake up just after every candle close and fetch only the candles closed since the last decision
+    # blocking api calls run in threads, so markets only wait on each other through the rate limiter
+    # `warmup` seconds before the close the pooled connections are opened, so the decision does not pay the handshake
+    clock = clock or provider.Clock()
+    # stages and request metrics per market, on the shared connections and rate limiter
+    recorder = recorder.scope()
+    if recorder.enabled: api = api.scope()
     semaphore = None
-    api = provider.RestClient(api_key=settings['key'], api_secret=settings['secret'])
 
     while True:
+        try:
+            # indicators: seed once from history, a market without candles (yet) is tried again every close
+            # and makes no decisions until then
+            if semaphore is None:
+                data = await asyncio.to_thread(api.get_market, market, interval, 1440, 1)
+                if len(data):
+                    stream = indicators.Stream(LIVE_INDICATORS)
+                    row = stream.seed(data)
+                    semaphore = data[-1, 0]
+                else:
+                    print(f'[ERROR] {market} no candles to seed the indicators from')
+
+            close = provider.next_close(clock.time() * 1000, interval)
+            if warmup:
+                await clock.sleep(close / 1000 - warmup - clock.time())
+                await asyncio.to_thread(api.warm)
+            await clock.sleep(close / 1000 + delay - clock.time())
+            if semaphore is None: continue
+
+            # the candle that just closed may take a moment to show up
+            with recorder.stage('candles'):
+                for _ in range(retries):
+                    try:
+                        data = await asyncio.to_thread(api.get_market, market, interval, 1440, 1, semaphore, clock.time() * 1000)
+                    except requests.RequestException as e:
+                        # a failed request is tried again like a missing candle
+                        print(f'[ERROR] {market} {e!r}')
+                        data = np.empty((0, 6))
+                    if len(data) and provider.candle_close(data[-1, 0], interval) >= close: break
+                    await clock.sleep(retry)
+            if not len(data): continue
+
+            for candle in data:
+                row = stream.update(candle)
+            semaphore = data[-1, 0]
 
-        # get data
-        data = api.get_data(market=market, interval=interval, number=1)
+            # report, with the time since the candle closed
+            closed = provider.candle_close(semaphore, interval) / 1000
+            print(f'{market} {provider.to_date(semaphore)} +{clock.time() - closed:.2f}s')
 
-        # semaphore
-        if data[-1, 0] == semaphore:
-            sleep(20)
-            continue
-        else:
-            semaphore = data[-1, 0]
+            buy, sell = await asyncio.to_thread(act, api, market, interval, row, recorder)
+            if buy or sell: print(f'{market} order +{clock.time() - closed:.2f}s')
 
-        # report
-        print(provider.to_date(semaphore))
+            # request metrics since the previous export, with the seconds from the close to the decision
+            if recorder.enabled: api.metrics.export(recorder, market=market, date=provider.to_date(semaphore), decided=clock.time() - closed)
+        except Exception as e:
+            print(f'[ERROR] {market} {e!r}')
+            await clock.sleep(retry)
 
-        # strategy
-        buy, sell = strategy(api, market, interval, False)
 
-        # act
-        try: quo = float(api.get_balance(symbol=quote)[0]['available'])
-        except: quo = 0.0
-        try: sym = float(api.get_balance(symbol=symbol)[0]['available'])
-        except: quo = 0.0
-        
-        if buy:
-            result = api.place_order(market=market, side='buy', order_type='market', amountQuote=quo)
-        if sell:
-            result = api.place_order(market=market, side='sell', order_type='market', amount=sym)
+async def live_markets(markets: list, interval: str, api: provider.RestClient | None = None, clock: provider.Clock | None = None, recorder: metrics.Metrics = metrics.disabled, verbose: bool = True):
+    # one client for all markets: one connection pool, one rate limiter
+    if api is None:
+        api = provider.RestClient(api_key=settings['key'], api_secret=settings['secret'], workers=max(4, len(markets)), verbose=verbose)
+    await asyncio.gather(*[live_market(api, market, interval, clock, recorder=recorder) for market in markets])
 
-        # report
-        if buy or sell:
-            if buy: print('BUY ', end=' ')
-            if sell: print('SELL', end=' ')
-            print(f'{provider.to_date(data[-1, 0]):19s} {quo:16.2f} EUR  {sym:16.4f} {symbol}')
+
+def live():
+    # parameters, --markets=ETH-EUR,BTC-EUR
+    # request latency, bytes, rate limit waits and errors per candle as json lines, --metrics=path
+    # --quiet does not print every request
+    markets = ['ETH-EUR']
+    interval = '1h'
+    recorder = metrics.disabled
+    for arg in sys.argv:
+        if arg.startswith('--markets='): markets = arg.split('=')[1].split(',')
+        if arg.startswith('--metrics='): recorder = metrics.Metrics(arg.split('=')[1])
+
+    asyncio.run(live_markets(markets, interval, recorder=recorder, verbose='--quiet' not in sys.argv))
 
 
 if __name__ == '__main__':
@@ -366,6 +596,10 @@ if __name__ == '__main__':
     if '--dev' in sys.argv:
         fns = [os.path.join('data', fn) for fn in os.listdir('data')]
         for i, fn in enumerate(fns): print(f'{i:2d} {fn}')
-        with open(fns[int(input())], 'rb') as fh: population = pickle.load(fh)
+        fn = fns[int(input())]
+        if fn.endswith('.npz'):
+            population, meta = algo.load_checkpoint(fn)
+        else:
+            with open(fn, 'rb') as fh: population = pickle.load(fh)
         breakpoint()
     if '--live' in sys.argv: live()
\ No newline at end of file